@@ -3,20 +3,32 @@ import time
 import subprocess
 import os
 import numpy as np
-import sounddevice as sd
-import whisper
+import tutor_stt
+import tutor_audio
 import logging 
 import wave
 import csv
 import warnings # NEW: Import the warnings module
+# sounddevice is imported by tutor_audio's engines when they open a stream
 
 # --- CONFIGURATION ---
 MODEL_NAME = "large"
+# STT engine: "whisper" (openai-whisper), "faster-whisper" (CTranslate2 int8) or "onnx" (ONNX Runtime)
+STT_BACKEND = os.environ.get("TUTOR_STT_BACKEND", "whisper")
+STT_USE_DAEMON = True # Use the resident model of tutor_daemon.py when its socket exists
 LANGUAGE = "French"    # Language code for Whisper
 VOICE_NAME = "Audrey"  # macOS voice for TTS
-SAMPLE_RATE = 44100    # Standard audio sample rate
+SAMPLE_RATE = 44100    # Fallback device rate if the mic can't open at 16 kHz
 TEMP_AUDIO_FILE = "user_recording.wav"
+WHISPER_SAMPLE_RATE = tutor_audio.WHISPER_SAMPLE_RATE
+IN_MEMORY_AUDIO = True # Hand the recording straight to Whisper (no temp WAV, no ffmpeg)
 TUTOR_CONTENT_FILE = "tutor_content.csv"
+CAPTURE_RING_SECONDS = 60.0   # Ring buffer length (must exceed a recording plus its pre-roll)
+CAPTURE_PREROLL_SECONDS = 0.3 # Audio from before ENTER kept at the start of each recording
+CAPTURE_ENGINE = None # tutor_audio.CaptureEngine: one input stream kept open for the session
+SAY_SAMPLE_RATE = 22050 # 'say' renders 16-bit PCM at this rate, played in-process
+TEMP_SAY_FILE = "tutor_say.wav"
+AUDIO_PLAYER = None # tutor_audio.AudioPlayer: one output stream kept open for the session
 
 # Global variable to hold content, populated in main()
 TUTOR_CONTENT = [] 
@@ -90,29 +102,65 @@ def get_highlighted_comparison(expected, actual):
 
 # --- TTS & Audio Recording Functions ---
 
+def open_capture_engine():
+    """Opens a tutor_audio.CaptureEngine with this script's capture settings."""
+    return tutor_audio.CaptureEngine(CAPTURE_RING_SECONDS, CAPTURE_PREROLL_SECONDS, fallback_rate=SAMPLE_RATE)
+
+def get_capture_engine():
+    """Returns the session's CaptureEngine, opening the input stream on first use."""
+    global CAPTURE_ENGINE
+    if CAPTURE_ENGINE is None:
+        CAPTURE_ENGINE = open_capture_engine()
+    return CAPTURE_ENGINE
+
+def get_audio_player():
+    """Returns the session's AudioPlayer, opening the output stream on first use."""
+    global AUDIO_PLAYER
+    if AUDIO_PLAYER is None:
+        AUDIO_PLAYER = tutor_audio.AudioPlayer(SAY_SAMPLE_RATE)
+    return AUDIO_PLAYER
+
 def play_audio_file(file_path):
-    """Uses the macOS 'afplay' command to play a local audio file."""
+    """Plays a local WAV file through the in-process output engine."""
     try:
         logging.info(f"Playing audio file: {file_path}")
-        # 'afplay' is the standard command-line player on macOS
-        subprocess.run(['afplay', file_path], check=True)
-        time.sleep(0.5)
-    except subprocess.CalledProcessError as e:
-        print(f"Error calling 'afplay' command. File not played: {file_path}. Error: {e}")
-        print("Ensure the audio file exists and is accessible.")
+        samples, sample_rate = tutor_audio.read_wav_samples(file_path)
+        player = get_audio_player()
+        player.wait(player.enqueue(samples, sample_rate, file_path))
+    except Exception as e:
+        print(f"Error playing audio file: {file_path}. Error: {e}")
+        print("Ensure the audio file exists and is a 16-bit PCM WAV.")
 
 def speak_text(text, voice_name, rate=160):
-    """Uses the macOS 'say' command to speak text."""
+    """
+    Renders 'text' with the macOS 'say' command to 16-bit PCM and plays it
+    through the in-process output engine ('say' itself stays a subprocess:
+    macOS has no Python binding for its voices).
+    """
     try:
         logging.info(f"Speaking text: {text}")
         subprocess.run(
-            ['say', '-v', voice_name, f'--rate={rate}', text],
+            ['say', '-v', voice_name, f'--rate={rate}', '-o', TEMP_SAY_FILE,
+             '--file-format=WAVE', f'--data-format=LEI16@{SAY_SAMPLE_RATE}', text],
             check=True
         )
-        time.sleep(0.5)
+        samples, sample_rate = tutor_audio.read_wav_samples(TEMP_SAY_FILE)
+        player = get_audio_player()
+        player.wait(player.enqueue(samples, sample_rate, text))
     except subprocess.CalledProcessError as e:
         print(f"Error calling 'say' command: {e}")
         print("Please ensure you are on macOS or adjust the function for your OS.")
+    except Exception as e:
+        print(f"Error playing speech: {e}")
+
+def print_playback_stats():
+    """Reports this round's playback overhead against the old afplay/say + 0.5 s sleep path."""
+    if AUDIO_PLAYER is None:
+        return
+    clips, audio, overhead = AUDIO_PLAYER.take_stats()
+    if clips:
+        print(f"🔊 Playback: {clips} clip(s), {audio:.2f}s audio, {overhead * 1000:.0f} ms overhead "
+              f"(saved ≥ {clips * 0.5:.1f}s of fixed sleeps)")
 
 def present_phrase(source, voice_name):
     """
@@ -133,40 +181,51 @@ def present_phrase(source, voice_name):
 
 def record_audio():
     """
-    Records audio using a Push-to-Talk (PTT) mechanism via sounddevice.InputStream.
-    Recording starts when the user presses Enter and stops when Enter is pressed again.
+    Records audio using a Push-to-Talk (PTT) mechanism from the session's
+    always-open CaptureEngine. Recording starts when the user presses Enter
+    (plus CAPTURE_PREROLL_SECONDS before it) and stops when Enter is pressed again.
+    Returns a float32 16 kHz NumPy array when IN_MEMORY_AUDIO is set, otherwise
+    the path of the saved WAV file.
     """
-    print("-" * 50)
-    input("🎤 Press ENTER to START recording your phrase...")
-    print("🔴 Recording... Press ENTER again to STOP.")
-    print("-" * 50)
-    
-    audio_data = []
-    
-    # Callback function to continuously append incoming audio data to the list
-    def callback(indata, frames, time, status):
-        """This is called (from a separate thread) for each audio block."""
-        if status:
-            print(f"Audio Status Error: {status}", flush=True)
-        audio_data.append(indata.copy())
-
-    # Start a non-blocking stream
+    # The input stream stays open between rounds (opened on the first recording)
     try:
-        with sd.InputStream(samplerate=SAMPLE_RATE, channels=1, dtype='int16', callback=callback):
-            # Block the main thread, effectively recording until the user presses Enter
-            input() 
-            print("🛑 Recording stopped.")
+        engine = get_capture_engine()
     except Exception as e:
         print(f"Error during audio streaming: {e}")
         return None
 
+    print("-" * 50)
+    input("🎤 Press ENTER to START recording your phrase...")
+    start = engine.mark()
+    stats_start = engine.stats()
+    print("🔴 Recording... Press ENTER again to STOP.")
+    print("-" * 50)
+
+    # Block the main thread, effectively recording until the user presses Enter
+    input() 
+    end = engine.position()
+    print("🛑 Recording stopped.")
+
     # Process and save audio
-    if not audio_data:
+    if end == start:
         print("❌ No audio recorded.")
         return None
-        
-    # Concatenate all recorded NumPy arrays into a single array
-    recording = np.concatenate(audio_data, axis=0)
+
+    # Copy the recording (pre-roll included) out of the ring in one go
+    recording = engine.extract(start, end)
+    stats_end = engine.stats()
+    tutor_audio.print_capture_stats(recording, engine.device_rate,
+                                    stats_end["resample_cpu"] - stats_start["resample_cpu"], SAMPLE_RATE)
+    # The audio callback only counts problems; report them here, off the audio thread
+    overflows = stats_end["overflows"] - stats_start["overflows"]
+    dropped = stats_end["dropped_frames"] - stats_start["dropped_frames"]
+    if overflows or dropped:
+        print(f"⚠️ {overflows} input overflow(s) during this recording, ~{dropped} frames dropped.")
+
+    # In-memory handoff: skip the WAV round-trip entirely
+    if IN_MEMORY_AUDIO:
+        print("✅ Recording captured.")
+        return recording
 
     # Save recording to a temporary WAV file using Python's standard 'wave' module
     try:
@@ -174,9 +233,10 @@ def record_audio():
             wf.setnchannels(1)
             # 'int16' dtype is 2 bytes wide
             wf.setsampwidth(2) 
-            wf.setframerate(SAMPLE_RATE)
-            # Convert NumPy array to raw bytes
-            wf.writeframes(recording.tobytes())
+            wf.setframerate(WHISPER_SAMPLE_RATE)
+            # Convert the float32 samples to 16-bit PCM bytes
+            pcm = (np.clip(recording, -1.0, 1.0) * 32767).astype(np.int16)
+            wf.writeframes(pcm.tobytes())
         print("✅ Recording saved.")
     except Exception as e:
         print(f"Error saving WAV file with 'wave' module: {e}")
@@ -185,10 +245,23 @@ def record_audio():
     return TEMP_AUDIO_FILE
 
 def transcribe_audio(audio_path, model, language):
-    """Uses the Whisper model to transcribe the saved audio file."""
+    """
+    Uses the Whisper model to transcribe the recording. 'audio_path' may be a
+    WAV file path or a float32 16 kHz NumPy array (see record_audio).
+    """
     print("🧠 Transcribing audio with Whisper...")
+    if isinstance(audio_path, str):
+        with wave.open(audio_path, 'rb') as wf:
+            audio_duration = wf.getnframes() / wf.getframerate()
+    else:
+        audio_duration = len(audio_path) / WHISPER_SAMPLE_RATE
     try:
+        start_time = time.time()
         result = model.transcribe(audio_path, language=language)
+        transcribe_time = time.time() - start_time
+        # Same speed report as language_tutor_rpi.py, so backends can be compared
+        rtf = transcribe_time / audio_duration if audio_duration > 0 else float('inf')
+        print(f"⏱️ Transcription Time: {transcribe_time:.2f} seconds (RTF: {rtf:.2f})")
         return result["text"].strip()
     except Exception as e:
         print(f"Error during Whisper transcription: {e}")
@@ -212,14 +285,16 @@ def main():
         print("\nFATAL: Could not load tutor content. Exiting.")
         return
         
-    print(f"Loading Whisper model: {MODEL_NAME}...")
+    # A running tutor_daemon.py already holds the model; connect to it instead
+    stt_backend = tutor_stt.select_backend(STT_BACKEND, STT_USE_DAEMON)
+    print(f"Loading Whisper model: {MODEL_NAME} ({stt_backend} backend)...")
     try:
         # Load the model once at the start
-        model = whisper.load_model(MODEL_NAME)
+        model = tutor_stt.load_backend(stt_backend, MODEL_NAME)
         print("Model loaded successfully.")
     except Exception as e:
         print(f"FATAL: Could not load Whisper model. Error: {e}")
-        print("Ensure 'pip install whisper' was successful.")
+        print(f"Ensure the package for the '{STT_BACKEND}' STT backend is installed.")
         return
 
     input("Press Enter to start the first practice session...")
@@ -243,12 +318,13 @@ def main():
         
         # Present the phrase (either TTS or audio file)
         present_phrase(phrase_data['source'], VOICE_NAME)
+        print_playback_stats()
         
         # 2. Record user's attempt using PTT
         audio_file = record_audio() 
 
         # Handle recording failure
-        if not audio_file:
+        if audio_file is None:
             print("❌ Recording failed or was empty. Skipping transcription.")
             continue
 
@@ -263,12 +339,17 @@ def main():
         print("-" * 50)
 
         # 4. Clean up and prompt next action
-        os.remove(TEMP_AUDIO_FILE)
+        if isinstance(audio_file, str) and os.path.exists(audio_file):
+            os.remove(audio_file)
         
         action = input("Press Enter for next phrase, or type 'quit' to exit: ").lower()
         if action == 'quit':
             break
 
+    if CAPTURE_ENGINE is not None:
+        CAPTURE_ENGINE.close()
+    if AUDIO_PLAYER is not None:
+        AUDIO_PLAYER.close()
     print("--- Session ended. Au revoir! ---")
 
 if __name__ == "__main__":
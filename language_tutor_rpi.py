@@ -1,26 +1,75 @@
 import random
 import time
-import subprocess
 import os
 import numpy as np
-import sounddevice as sd
-import whisper
+import tutor_stt
+import tutor_audio
+import tutor_decoding
+import tutor_deck
+import tutor_store
+import tutor_scheduler
+import tutor_results
+import tutor_trace
 import logging
 import wave
 import csv
 import warnings
 import sys
 import select
-# NEW: Import the Piper voice modules
-from piper import PiperVoice
+import hashlib
+import json
+import argparse
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+# sounddevice and Piper are imported where they are used (tutor_audio's
+# engines, load_piper_voice), so tutor_benchmark and tutor_loopback can import this
+# module's transcription and scoring on a box without PortAudio or Piper.
 
 # --- CONFIGURATION ---
 MODEL_NAME = "small"
+# STT engine: "whisper" (openai-whisper), "faster-whisper" (CTranslate2 int8) or "onnx" (ONNX Runtime)
+STT_BACKEND = os.environ.get("TUTOR_STT_BACKEND", "whisper")
+STT_USE_DAEMON = True # Use the resident model of tutor_daemon.py when its socket exists
+# "transcribe": free decoding + word comparison; "forced": teacher-force the expected
+# phrase through the decoder and score it (whisper backend only, see tutor_decoding)
+SCORING_MODE = "transcribe"
+# Encode only the clip's real duration instead of padding it to 30 s
+# (whisper backend only; clips over tutor_decoding.SHORT_AUDIO_MAX_SECONDS use the full path)
+SHORT_AUDIO_MODE = False
+# Decode budget profile from tutor_decoding.DECODE_PROFILES ("open", "bounded", "strict"),
+# or None for plain model.transcribe(); DECODE_MAX_RETRIES caps the temperature fallback
+DECODE_PROFILE = None
+DECODE_MAX_RETRIES = None
+# Closed-vocabulary decoding: mask the logits to continuations of deck phrases
+# (whisper backend only). Lets "tiny"/"base" do the work of a larger model.
+DECK_CONSTRAINED = False
 LANGUAGE = "French"     # Language code for Whisper
-SAMPLE_RATE = 44100     # Standard audio sample rate
+SAMPLE_RATE = 44100     # Fallback device rate if the mic can't open at 16 kHz
 PIPER_MODEL_SAMPLE_RATE = 22050 # NEW: Correct rate for UPMC French model
 TEMP_AUDIO_FILE = "/tmp/tutor_user_recording.wav"
+WHISPER_SAMPLE_RATE = tutor_audio.WHISPER_SAMPLE_RATE
+IN_MEMORY_AUDIO = True  # Hand the recording straight to Whisper (no temp WAV, no ffmpeg)
 TUTOR_CONTENT_FILE = "tutor_content.csv"
+COMPILED_DECK_FILE = "tutor_content.deck" # Built with tutor_deck.py; used when it matches the CSV
+# Indexed SQLite phrase store (tutor_store.py) for large decks; rows are fetched lazily.
+# When set, it replaces the CSV and is filtered by the PHRASE_* selection below.
+PHRASE_STORE_FILE = None
+PHRASE_TAGS = []
+PHRASE_LANGUAGE = None
+PHRASE_MIN_DIFFICULTY = None
+PHRASE_MAX_DIFFICULTY = None
+# Spaced repetition (SM-2, see tutor_scheduler.py) instead of random phrases
+USE_SCHEDULER = True
+SCHEDULE_FILE = tutor_scheduler.SCHEDULE_FILE
+# Append-only per-round results log (tutor_results.py); written off the interactive loop
+RESULTS_LOG_ENABLED = True
+RESULTS_DIR = tutor_results.RESULTS_DIR
+RESULTS_KEEP_AUDIO = False # Also keep each in-memory recording as a WAV in RESULTS_DIR/audio
+# Per-stage round spans (tutor_trace.py): JSONL + Prometheus textfile + p50/p95 summary
+TRACE_ENABLED = True
+TRACE_FILE = tutor_trace.TRACE_FILE
+TRACE_PROM_FILE = tutor_trace.PROM_FILE
 
 # --- PIPER TTS CONFIGURATION ---
 # Absolute paths to the downloaded UPMC voice model files
@@ -29,6 +78,12 @@ PIPER_CONFIG_PATH = "/home/pi/.local/share/piper-tts/piper-voices/fr/fr_FR/upmc/
 JESSICA_ID = 0 # Female voice
 PIERRE_ID = 1  # Male voice
 
+# On-disk cache of rendered Piper audio (raw 16-bit PCM), LRU-evicted past the size limit
+TTS_CACHE_DIR = os.path.expanduser("~/.cache/language-tutor/tts")
+TTS_CACHE_MAX_BYTES = 256 * 1024 * 1024
+TTS_CACHE_VERSION = 2 # Bumped when cached audio was rendered wrongly (1: speaker id ignored)
+TTS_PREWARM_WORKERS = os.cpu_count() or 1
+
 # VVVV CHANGE SPEAKER HERE VVVV
 # Set this to JESSICA_ID (0) or PIERRE_ID (1) to select the voice gender.
 PIPER_SPEAKER_ID = JESSICA_ID
@@ -37,6 +92,40 @@ PIPER_SPEAKER_ID = JESSICA_ID
 # Global variables to hold content and the Piper voice object
 TUTOR_CONTENT = []
 PIPER_VOICE = None
+AUDIO_PLAYER = None
+CLIP_GAP_SECONDS = 0.15 # Silence queued between "Répétez" and the phrase
+PIPELINE_QUEUE_SIZE = 2 # Recordings allowed to wait for transcription in --pipeline mode
+MODEL_LOCK = threading.Lock()
+DECK_TRIE = None # tutor_decoding.DeckTrie over TUTOR_CONTENT, built on first use
+SCHEDULER = None # tutor_scheduler.Scheduler when USE_SCHEDULER
+RESULTS_LOG = None # tutor_results.ResultsLog when RESULTS_LOG_ENABLED
+TRACER = tutor_trace.Tracer(enabled=False) # Replaced in main() when TRACE_ENABLED
+
+# --- STREAMING TRANSCRIPTION (--stream) ---
+STREAM_WINDOW_SECONDS = 8.0     # Rolling window decoded for each partial
+STREAM_INTERVAL_SECONDS = 0.5   # Minimum time between partial decodes
+STREAM_MIN_SAMPLES = int(0.3 * WHISPER_SAMPLE_RATE) # Don't decode less than this
+STREAM_REUSE_TAIL_SECONDS = 0.1 # Reuse the last partial if at most this much audio is undecoded
+
+# --- CAPTURE ENGINE ---
+CAPTURE_RING_SECONDS = 30.0     # Ring buffer length (must exceed a recording plus its pre-roll)
+CAPTURE_PREROLL_SECONDS = 0.3   # Audio from before ENTER kept at the start of each recording
+CAPTURE_BLOCK_SIZE = 1024       # Device frames per callback (starting value)
+CAPTURE_MIN_BLOCK_SIZE = 512    # Block size adapts within these bounds:
+CAPTURE_MAX_BLOCK_SIZE = 4096   # doubled after a recording with overruns,
+CAPTURE_SHRINK_AFTER = 5        # halved after this many clean recordings
+CAPTURE_ENGINE = None # CaptureEngine: one input stream kept open for the session
+
+# --- VOICE ACTIVITY DETECTION ---
+VAD_ENABLED = True          # Auto-stop at end of speech, trim silence, skip Whisper on silence
+VAD_FRAME_SECONDS = 0.03    # Analysis frame length
+VAD_MIN_RMS = 0.005         # Absolute floor for the speech threshold (float32 full scale = 1.0)
+VAD_SNR = 3.0               # Speech must be this many times louder than the noise floor
+VAD_NOISE_RISE = 1.02       # Per-frame growth allowed for the noise floor estimate
+VAD_START_FRAMES = 3        # Consecutive speech frames needed to start (ignores clicks)
+VAD_CALIBRATION_FRAMES = 5  # Initial frames used only to estimate the noise floor (if quiet, see EnergyVAD)
+VAD_HANGOVER_SECONDS = 0.8  # Silence after speech that ends the recording
+VAD_PAD_SECONDS = 0.15      # Audio kept around the speech when trimming
 
 # --- ANSI Color Codes for Output ---
 BLUE = '\033[94m'
@@ -51,7 +140,28 @@ def load_tutor_content(file_path):
     """
     Reads the tutor content from a CSV file and returns it as a list of dictionaries.
     Keys are derived from the CSV header (text, source, translation, notes).
+    If COMPILED_DECK_FILE was compiled from this CSV, its memory-mapped rows
+    are returned instead (same keys, plus precomputed words/prompt_tokens/phonemes).
+    With PHRASE_STORE_FILE set, the selected phrases of that store are returned.
     """
+    if PHRASE_STORE_FILE:
+        try:
+            selection = tutor_store.open_selection(PHRASE_STORE_FILE, PHRASE_TAGS, PHRASE_LANGUAGE,
+                                                   PHRASE_MIN_DIFFICULTY, PHRASE_MAX_DIFFICULTY)
+        except FileNotFoundError:
+            print(f"FATAL: Phrase store not found: {PHRASE_STORE_FILE}")
+            return []
+        except Exception as e:
+            print(f"FATAL: Error opening phrase store: {e}")
+            return []
+        print(f"✅ Selected {len(selection)} phrases from {PHRASE_STORE_FILE}")
+        return selection
+
+    deck = tutor_deck.load_deck(file_path, COMPILED_DECK_FILE)
+    if deck is not None:
+        print(f"✅ Loaded {len(deck)} phrases from compiled deck {COMPILED_DECK_FILE}")
+        return deck
+
     content_list = []
     try:
         with open(file_path, mode='r', encoding='utf-8') as file:
@@ -107,40 +217,212 @@ def get_highlighted_comparison(expected, actual):
     return " ".join(highlighted_actual)
 
 
+# --- Audio Output (tutor_audio.AudioPlayer) ---
+def print_playback_stats():
+    """Reports this round's playback overhead against the old aplay + 0.5 s sleep path."""
+    if AUDIO_PLAYER is None:
+        return
+    clips, audio, overhead = AUDIO_PLAYER.take_stats()
+    if clips:
+        print(f"🔊 Playback: {clips} clip(s), {audio:.2f}s audio, {overhead * 1000:.0f} ms overhead "
+              f"(saved ≥ {clips * 0.5:.1f}s of fixed sleeps and {clips} aplay spawn(s))")
+
+def get_confidence_highlight(word_scores):
+    """
+    Colors each expected word by the model's confidence from forced-alignment
+    scoring (green: clearly heard, yellow: uncertain, red: not heard).
+    """
+    highlighted = []
+    for word, prob in word_scores:
+        if prob >= 0.5:
+            color = GREEN
+        elif prob >= tutor_decoding.FORCED_PASS_WORD_PROB:
+            color = YELLOW
+        else:
+            color = RED
+        highlighted.append(f"{color}{word}{ENDC}")
+    return " ".join(highlighted)
+
+
 # --- TTS & Audio Recording Functions ---
+def queue_audio_file(file_path):
+    """Queues a local WAV file on the output engine and returns its AudioClip."""
+    logging.info(f"Playing audio file: {file_path}")
+    samples, sample_rate = tutor_audio.read_wav_samples(file_path)
+    return AUDIO_PLAYER.enqueue(samples, sample_rate, file_path)
+
 def play_audio_file(file_path):
-    """Uses the Linux 'aplay' command to play a local audio file."""
+    """Plays a local WAV file through the in-process output engine."""
     try:
-        logging.info(f"Playing audio file: {file_path}")
-        subprocess.run(['aplay', file_path], check=True) 
-        time.sleep(0.5)
-    except subprocess.CalledProcessError as e:
-        print(f"Error calling 'aplay' command. File not played: {file_path}. Error: {e}")
-        print("Ensure the audio file exists and is accessible, and 'alsa-utils' is installed.")
+        AUDIO_PLAYER.wait(queue_audio_file(file_path))
+    except Exception as e:
+        print(f"Error playing audio file: {file_path}. Error: {e}")
+        print("Ensure the audio file exists and is a 16-bit PCM WAV.")
 
-# --- TTS & Audio Recording Functions ---
-def play_audio_file(file_path):
-    """Uses the Linux 'aplay' command to play a local audio file."""
+# --- Piper TTS Cache ---
+def piper_sample_rate(voice):
+    """Returns the output sample rate of a loaded PiperVoice (fallbacks remain necessary)."""
     try:
-        logging.info(f"Playing audio file: {file_path}")
-        subprocess.run(['aplay', file_path], check=True) 
-        time.sleep(0.5)
-    except subprocess.CalledProcessError as e:
-        print(f"Error calling 'aplay' command. File not played: {file_path}. Error: {e}")
-        print("Ensure the audio file exists and is accessible, and 'alsa-utils' is installed.")
+        return voice.config.sample_rate
+    except AttributeError:
+        try:
+            return voice.config.audio.sample_rate
+        except AttributeError:
+            return PIPER_MODEL_SAMPLE_RATE
+
+def tts_cache_path(text, model_path, speaker_id, sample_rate):
+    """
+    Returns the cache file for a rendered phrase. The name is a SHA-256 of
+    (text, model path, speaker id, sample rate, cache version), so any change
+    to the voice setup simply misses instead of playing stale audio.
+    """
+    key = json.dumps([text, model_path, speaker_id, sample_rate, TTS_CACHE_VERSION], ensure_ascii=False)
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return os.path.join(TTS_CACHE_DIR, digest + ".pcm")
+
+def evict_tts_cache(max_bytes=TTS_CACHE_MAX_BYTES):
+    """
+    Deletes the least recently used entries until the cache fits in 'max_bytes'.
+    Recency is the file mtime, which synthesize_pcm() refreshes on every hit.
+    """
+    try:
+        entries = []
+        with os.scandir(TTS_CACHE_DIR) as it:
+            for entry in it:
+                if entry.name.endswith(".pcm"):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+    except FileNotFoundError:
+        return
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def synthesize_pcm(text, evict=True):
+    """
+    Returns (audio_bytes, sample_rate) for 'text' in the selected speaker's voice,
+    as raw 16-bit mono PCM. Served from the on-disk cache when possible,
+    otherwise rendered with the global PiperVoice and stored.
+    """
+    sample_rate = piper_sample_rate(PIPER_VOICE)
+    cache_file = tts_cache_path(text, PIPER_MODEL_PATH, PIPER_SPEAKER_ID, sample_rate)
 
-# --- TTS & Audio Recording Functions ---
-def play_audio_file(file_path):
-    """Uses the Linux 'aplay' command to play a local audio file."""
     try:
-        logging.info(f"Playing audio file: {file_path}")
-        subprocess.run(['aplay', file_path], check=True) 
-        time.sleep(0.5)
-    except subprocess.CalledProcessError as e:
-        print(f"Error calling 'aplay' command. File not played: {file_path}. Error: {e}")
-        print("Ensure the audio file exists and is accessible, and 'alsa-utils' is installed.")
+        with open(cache_file, 'rb') as f:
+            audio_bytes = f.read()
+        os.utime(cache_file) # Mark as recently used for LRU eviction
+        return audio_bytes, sample_rate
+    except FileNotFoundError:
+        pass
+
+    # 1. SPEAKER LOGIC for 1.3.0: synthesize() reads the speaker from its SynthesisConfig only
+    from piper import SynthesisConfig
+    syn_config = SynthesisConfig(speaker_id=PIPER_SPEAKER_ID)
+
+    # 2. Join all audio chunks, extracting the raw bytes (.audio_int16_bytes)
+    audio_bytes = b"".join(chunk.audio_int16_bytes
+                           for chunk in PIPER_VOICE.synthesize(text, syn_config=syn_config))
+
+    # 3. Store atomically so a concurrent reader never sees a partial file
+    try:
+        os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(audio_bytes)
+        os.replace(tmp_file, cache_file)
+        if evict:
+            evict_tts_cache()
+    except OSError as e:
+        logging.info(f"Could not write TTS cache entry: {e}")
+
+    return audio_bytes, sample_rate
+
+def load_piper_voice(model_path=PIPER_MODEL_PATH, config_path=PIPER_CONFIG_PATH):
+    """Loads a PiperVoice (Piper is only imported here)."""
+    from piper import PiperVoice
+    return PiperVoice.load(model_path, config_path)
+
+def _prewarm_worker_init(model_path, config_path):
+    """Loads a private PiperVoice in each pre-warm worker process."""
+    global PIPER_VOICE
+    warnings.filterwarnings("ignore", category=UserWarning)
+    PIPER_VOICE = load_piper_voice(model_path, config_path)
+
+def _prewarm_render(text):
+    """Renders one phrase into the cache from a pre-warm worker."""
+    synthesize_pcm(text, evict=False)
+    return text
+
+def deck_tts_texts(content):
+    """Returns every distinct phrase the session can speak: the prompt plus each row."""
+    texts = ["Répétez"]
+    for row in content:
+        texts.append(row['text'])
+        source = row.get('source')
+        if source and not os.path.exists(source):
+            texts.append(source)
+    return list(dict.fromkeys(texts))
+
+def prewarm_tts_cache(content, workers=TTS_PREWARM_WORKERS):
+    """
+    Pre-renders every phrase of the deck into the TTS cache, in parallel across
+    cores (one PiperVoice per worker process), so no round waits on synthesis.
+    """
+    sample_rate = piper_sample_rate(PIPER_VOICE)
+    missing = [text for text in deck_tts_texts(content)
+               if not os.path.exists(tts_cache_path(text, PIPER_MODEL_PATH, PIPER_SPEAKER_ID, sample_rate))]
+    if not missing:
+        print("✅ TTS cache already warm.")
+        return
+
+    print(f"Pre-rendering {len(missing)} phrases with {workers} workers...")
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_prewarm_worker_init,
+                             initargs=(PIPER_MODEL_PATH, PIPER_CONFIG_PATH)) as pool:
+        for text in pool.map(_prewarm_render, missing):
+            logging.info(f"Cached TTS for: {text}")
+    evict_tts_cache()
+    print(f"✅ TTS cache warmed in {time.time() - start_time:.1f} seconds")
+
+def prepare_round(content):
+    """
+    Picks the next phrase (due review or random) and renders all of its Piper audio ahead of time.
+    Runs on the prefetch worker thread while Whisper transcribes the current
+    attempt (onnxruntime releases the GIL, so it uses an otherwise idle core).
+    Returns (phrase_data, prerendered, timings) with the "selection" and "tts"
+    seconds (traced under the round the phrase ends up in).
+    """
+    start_time = time.perf_counter()
+    phrase_data = SCHEDULER.next_item() if SCHEDULER is not None else random.choice(content)
+    selected_time = time.perf_counter()
+    prerendered = {"Répétez": synthesize_pcm("Répétez")}
+    source = phrase_data['source']
+    if isinstance(source, str) and not os.path.exists(source):
+        prerendered[source] = synthesize_pcm(source)
+    timings = {"selection": selected_time - start_time, "tts": time.perf_counter() - selected_time}
+    return phrase_data, prerendered, timings
+
+def queue_text(text, prerendered=None):
+    """
+    Queues Piper audio for 'text' on the output engine and returns its AudioClip.
+    Audio already rendered by prepare_round() is used as-is.
+    """
+    logging.info(f"Generating audio for: {text}")
+    if prerendered and text in prerendered:
+        audio_bytes, sample_rate = prerendered[text]
+    else:
+        audio_bytes, sample_rate = synthesize_pcm(text)
+    return AUDIO_PLAYER.enqueue(np.frombuffer(audio_bytes, dtype=np.int16), sample_rate, text)
 
-def speak_text(text, output_filename="/tmp/tutor_speak.wav"):
+def speak_text(text):
     """
     Uses the global PiperVoice model to speak the text in the selected speaker's voice.
     """
@@ -151,138 +433,253 @@ def speak_text(text, output_filename="/tmp/tutor_speak.wav"):
         return
 
     try:
-        logging.info(f"Generating audio for: {text}")
-
-        # 1. SPEAKER LOGIC for 1.3.0: Set the speaker ID on the voice object before synthesis.
-        PIPER_VOICE.speaker_id = PIPER_SPEAKER_ID 
-        
-        # 2. Use PiperVoice to synthesize the audio bytes (FIXED: Join and Extract from AudioChunk)
-        audio_generator = PIPER_VOICE.synthesize(text)
-        
-        # Join all audio chunks, extracting the raw bytes using the definitive property (.audio_int16_bytes)
-        audio_bytes = b"".join(chunk.audio_int16_bytes for chunk in audio_generator) 
-
-        # 3. Determine the Sample Rate (Fallbacks remain necessary)
-        try:
-            sample_rate = PIPER_VOICE.config.audio.sample_rate
-        except AttributeError:
-            sample_rate = 22050 
-        
-        # 4. Write the raw audio bytes to a proper WAV file
-        with wave.open(output_filename, 'wb') as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2) # 16-bit audio (2 bytes)
-            wf.setframerate(sample_rate)
-            wf.writeframes(audio_bytes)
-        
-        # 5. Use aplay to play the generated WAV file
-        # FIX: Open os.devnull and pass it to subprocess to silence the "Playing WAVE..." output.
-        with open(os.devnull, 'w') as devnull:
-            subprocess.run(
-                ['aplay', output_filename],
-                check=True,
-                stdout=devnull, 
-                stderr=devnull
-            )
-        time.sleep(0.5)
-
+        AUDIO_PLAYER.wait(queue_text(text))
     except Exception as e:
         print(f"Error generating audio with Piper: {e}")
 
-    finally:
-        # Clean up the temporary file
-        if os.path.exists(output_filename):
-            os.remove(output_filename)
-
-def present_phrase(source): # Removed 'voice_name' argument
+def present_phrase(source, prerendered=None): # Removed 'voice_name' argument
     """
     Presents the content. If 'source' is a file path, it plays the file.
     Otherwise, it uses TTS (Piper) to speak the content.
+    The prompt and the content are queued back to back and played gaplessly;
+    'prerendered' holds audio synthesized ahead of time by prepare_round().
     """
-    # 1. Speak the instruction (Répétez)
-    speak_text("Répétez")
-    
-    # 2. Present the source content
-    if isinstance(source, str) and os.path.exists(source):
-        play_audio_file(source)
-    elif isinstance(source, str):
-        speak_text(source)
-    else:
-        print(f"Error: Unknown content source type or file not found: {source}")
+    try:
+        # 1. Queue the instruction (Répétez)
+        queue_text("Répétez", prerendered)
+        AUDIO_PLAYER.enqueue_silence(CLIP_GAP_SECONDS)
+
+        # 2. Queue the source content, then wait for both to finish
+        if isinstance(source, str) and os.path.exists(source):
+            last_clip = queue_audio_file(source)
+        elif isinstance(source, str):
+            last_clip = queue_text(source, prerendered)
+        else:
+            print(f"Error: Unknown content source type or file not found: {source}")
+            return
+        AUDIO_PLAYER.wait(last_clip)
+    except Exception as e:
+        print(f"Error presenting phrase: {e}")
+
+def open_capture_engine():
+    """Opens a tutor_audio.CaptureEngine with this script's capture settings."""
+    return tutor_audio.CaptureEngine(CAPTURE_RING_SECONDS, CAPTURE_PREROLL_SECONDS, CAPTURE_BLOCK_SIZE,
+                                     CAPTURE_MIN_BLOCK_SIZE, CAPTURE_MAX_BLOCK_SIZE, CAPTURE_SHRINK_AFTER,
+                                     SAMPLE_RATE)
+
+def get_capture_engine():
+    """Returns the session's CaptureEngine, opening the input stream on first use."""
+    global CAPTURE_ENGINE
+    if CAPTURE_ENGINE is None:
+        CAPTURE_ENGINE = open_capture_engine()
+    return CAPTURE_ENGINE
+
+# --- Voice Activity Detection ---
+class EnergyVAD:
+    """
+    Low-overhead energy VAD run inside the capture loop on 30 ms frames.
+    The noise floor tracks the quietest recent frames, so the threshold adapts
+    to the room; once speech has started it can only drop, so neither speech
+    frames nor the soft frames between syllables raise it during a long phrase.
+    Calibration frames louder than VAD_MIN_RMS (the learner may already be
+    speaking in the pre-roll) are classified instead of seeding the floor.
+    Reports end of speech after VAD_HANGOVER_SECONDS of silence and remembers
+    where speech started/ended so the clip can be trimmed.
+    """
+    def __init__(self, sample_rate=WHISPER_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.frame_len = int(VAD_FRAME_SECONDS * sample_rate)
+        self.hangover_frames = int(VAD_HANGOVER_SECONDS / VAD_FRAME_SECONDS)
+        self.noise = None
+        self.speech_start = None # Sample index of the first speech frame
+        self.speech_end = None   # Sample index just past the last speech frame
+        self.ended = False
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._frames_seen = 0
+        self._run = 0     # Consecutive speech frames
+        self._silence = 0 # Consecutive non-speech frames since the last speech
+
+    def process(self, block):
+        """Consumes a 16 kHz block; returns True once the learner has stopped speaking."""
+        audio = np.concatenate((self._pending, block)) if len(self._pending) else block
+        n_frames = len(audio) // self.frame_len
+        self._pending = audio[n_frames * self.frame_len:]
+        if n_frames == 0:
+            return self.ended
+
+        frames = audio[:n_frames * self.frame_len].reshape(n_frames, self.frame_len)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        for level in rms:
+            index = self._frames_seen
+            self._frames_seen += 1
+            if index < VAD_CALIBRATION_FRAMES and level <= VAD_MIN_RMS:
+                # The first quiet frames only seed the noise floor
+                self.noise = level if self.noise is None else min(self.noise, level)
+                continue
+            noise = VAD_MIN_RMS if self.noise is None else self.noise # No quiet frame yet
+            is_speech = level > max(VAD_MIN_RMS, noise * VAD_SNR)
+            # Minimum tracking: drop straight to quieter frames, creep up only before speech
+            if self.speech_start is None and not is_speech:
+                self.noise = max(min(level, noise * VAD_NOISE_RISE), 1e-6)
+            else:
+                self.noise = max(min(level, noise), 1e-6)
+
+            if is_speech:
+                self._run += 1
+                self._silence = 0
+                if self.speech_start is None and self._run >= VAD_START_FRAMES:
+                    self.speech_start = (index - VAD_START_FRAMES + 1) * self.frame_len
+                if self.speech_start is not None:
+                    self.speech_end = (index + 1) * self.frame_len
+            else:
+                self._run = 0
+                if self.speech_start is not None:
+                    self._silence += 1
+                    if self._silence >= self.hangover_frames:
+                        self.ended = True
+        return self.ended
+
+    def trim_bounds(self, length):
+        """(start, end) of the speech plus padding in a recording of 'length' samples, or None if there was no speech."""
+        if self.speech_start is None:
+            return None
+        pad = int(VAD_PAD_SECONDS * self.sample_rate)
+        end = self.speech_end if self.speech_end is not None else length
+        return max(0, self.speech_start - pad), min(length, end + pad)
 
-def record_audio(blue_color, red_color, filename=TEMP_AUDIO_FILE):
+    def trim(self, recording):
+        """Returns 'recording' without leading/trailing silence, or None if there was no speech."""
+        bounds = self.trim_bounds(len(recording))
+        return None if bounds is None else recording[bounds[0]:bounds[1]]
+
+def record_audio(blue_color, red_color, filename=TEMP_AUDIO_FILE, on_block=None, on_trim=None):
     """
-    Records audio from the default microphone and saves it as a WAV file.
+    Records audio from the default microphone.
     Uses push-to-talk style recording (Press ENTER to start, ENTER to stop).
-    Returns a tuple (filename, duration) or None on failure.
+    Audio comes from the session's CaptureEngine (always-open stream + ring
+    buffer), starting CAPTURE_PREROLL_SECONDS before ENTER.
+    'on_block', if given, receives every 16 kHz block as it arrives
+    (e.g. StreamingTranscriber.feed). With VAD_ENABLED, recording also stops
+    at the end of speech, the silence around it is trimmed, and recordings
+    with no speech return None so Whisper is skipped entirely. 'on_trim', if
+    given, receives the kept (start, end) in the samples passed to 'on_block'
+    (e.g. StreamingTranscriber.set_clip).
+    Returns a tuple (audio, duration) or None on failure, where 'audio' is a
+    float32 16 kHz NumPy array when IN_MEMORY_AUDIO is set, otherwise the WAV filename.
     """
 
-    global SAMPLE_RATE 
+    # Reopen the input stream if the last recording changed its block size,
+    # now rather than between that recording and its transcription
+    if CAPTURE_ENGINE is not None:
+        try:
+            CAPTURE_ENGINE.apply_block_size()
+        except Exception as e:
+            print(f"Error during audio streaming: {e}")
 
-    # Define a generous maximum recording duration
-    max_duration = 10  
-    
     # Wait for the user to press ENTER to start
     # FIX: Using the passed color arguments
-    input(f"{blue_color}Press ENTER to START recording your phrase...{ENDC}")
-    print(f"{red_color}Recording... Press ENTER again to STOP.{ENDC}")
-
-    # Start a non-blocking stream for continuous recording until interrupted
-    stream = sd.InputStream(samplerate=SAMPLE_RATE, 
-                            channels=1, # CRITICAL FIX: Set to 1 channel (mono)
-                            dtype='int16')
-    stream.start()
+    # (Traced on its own: the learner's reaction time is not capture latency)
+    with TRACER.span("prompt_wait"):
+        input(f"{blue_color}Press ENTER to START recording your phrase...{ENDC}")
+    with TRACER.span("capture"):
+        return capture_attempt(red_color, filename, on_block, on_trim)
+
+def capture_attempt(red_color, filename=TEMP_AUDIO_FILE, on_block=None, on_trim=None):
+    """
+    The part of record_audio() after the first ENTER: reads the ring until
+    ENTER, end of speech or the time limit, then trims and hands off the
+    recording. Same arguments and return value as record_audio().
+    """
+    # Define a generous maximum recording duration
+    max_duration = 10  
     
-    # Store audio data in a list
-    audio_data = []
+    if VAD_ENABLED:
+        print(f"{red_color}Recording... Stop speaking or press ENTER to STOP.{ENDC}")
+    else:
+        print(f"{red_color}Recording... Press ENTER again to STOP.{ENDC}")
+    vad = EnergyVAD() if VAD_ENABLED else None
+
+    # The input stream is already running; just remember where this recording starts
+    try:
+        engine = get_capture_engine()
+    except Exception as e:
+        print(f"Error during audio streaming: {e}")
+        return None
+    start_cursor = cursor = engine.mark()
+    stats_start = engine.stats()
     start_time = time.time()
+    cpu_start = time.process_time()
+    loop_cpu_start = time.thread_time()
 
     # Wait for the user to press ENTER again or reach max duration
     try:
-        # Use select to wait for input on stdin without blocking the loop entirely
-        while not select.select([sys.stdin], [], [], 0) == ([sys.stdin], [], []) and (time.time() - start_time) < max_duration:
-             # Read data in small blocks
-            try:
-                data, overflowed = stream.read(1024)
-                audio_data.append(data.copy())
-            except sd.PortAudioError as e:
-                 # Handle common recording errors gracefully
-                print(f"Error during audio streaming: {e}")
-                stream.close()
-                return None
-        
-        # Stop the stream when ENTER is pressed or max duration reached
-        stream.stop()
+        while True:
+            remaining = max_duration - (time.time() - start_time)
+            if remaining <= 0:
+                break
+            # Sleep until ENTER, a new audio block (wake pipe) or the time limit
+            readable, _, _ = select.select([sys.stdin, engine.wake_fd], [], [], remaining)
+            if sys.stdin in readable:
+                sys.stdin.readline() # Consume the ENTER so the next prompt still waits
+                break
+            engine.drain_wake()
+            # Take whatever the callback has written since the last pass
+            block, cursor = engine.read(cursor, timeout=0)
+            if block is None:
+                continue
+            if on_block is not None:
+                on_block(block.copy()) # The ring slot is reused later
+            if vad is not None and vad.process(block):
+                print("🔇 End of speech detected.")
+                break
 
     except Exception as e:
         print(f"Error during audio streaming: {e}")
         return None
 
-    finally:
-        if stream.active:
-            stream.stop()
-        if stream.stopped == False:
-            stream.close()
-
     print("--------------------------------------------------")
+    wall_seconds = time.time() - start_time
+    health = tutor_audio.print_capture_health(stats_start, engine.stats(), wall_seconds,
+                                              time.thread_time() - loop_cpu_start,
+                                              time.process_time() - cpu_start, engine.blocksize)
+    engine.adapt_block_size(health["overflows"] + (health["dropped_frames"] > 0)) # Applied at the next prompt
 
     # If no audio data was recorded (user hit enter too fast or error)
-    if not audio_data:
+    if cursor == start_cursor:
         return None
 
-    # Concatenate the audio blocks into a single NumPy array
-    recording = np.concatenate(audio_data, axis=0)
+    # Copy the recording (pre-roll included) out of the ring in one go
+    recording = engine.extract(start_cursor, cursor)
+    tutor_audio.print_capture_stats(recording, engine.device_rate, health["resample_cpu"], SAMPLE_RATE)
+
+    # Drop the silence before and after the speech; nothing to transcribe without speech
+    if vad is not None:
+        captured_duration = recording.shape[0] / WHISPER_SAMPLE_RATE
+        bounds = vad.trim_bounds(len(recording))
+        if bounds is None:
+            print("🔇 No speech detected.")
+            return None
+        recording = recording[bounds[0]:bounds[1]]
+        if on_trim is not None:
+            on_trim(*bounds)
+        print(f"✂️ Trimmed {captured_duration - recording.shape[0] / WHISPER_SAMPLE_RATE:.2f}s of silence")
 
     # Calculate duration
-    audio_duration = recording.shape[0] / SAMPLE_RATE
+    audio_duration = recording.shape[0] / WHISPER_SAMPLE_RATE
+
+    # In-memory handoff: skip the WAV write and Whisper's ffmpeg decode
+    if IN_MEMORY_AUDIO:
+        print(f"✅ Recording captured ({audio_duration:.2f} seconds)")
+        return recording, audio_duration
 
     # Save the NumPy array to a WAV file
     try:
-        with wave.open(filename, 'wb') as wf:
+        with TRACER.span("wav_save"), wave.open(filename, 'wb') as wf:
             wf.setnchannels(1) # Must match the recording channel count
             wf.setsampwidth(2) # 16-bit audio (2 bytes)
-            wf.setframerate(SAMPLE_RATE)
-            wf.writeframes(recording.tobytes())
+            wf.setframerate(WHISPER_SAMPLE_RATE)
+            pcm = (np.clip(recording, -1.0, 1.0) * 32767).astype(np.int16)
+            wf.writeframes(pcm.tobytes())
         
         print(f"✅ Recording saved to {filename} ({audio_duration:.2f} seconds)")
         return filename, audio_duration # RETURNS FILENAME AND DURATION
@@ -291,16 +688,24 @@ def record_audio(blue_color, red_color, filename=TEMP_AUDIO_FILE):
         print(f"Error saving audio file: {e}")
         return None
 
-def transcribe_audio(audio_file, model, language, prompt_text, audio_duration): 
+def transcribe_audio(audio_file, model, language, prompt_text, audio_duration, streamer=None, prompt_tokens=None): 
     """
-    Transcribes the given audio file using the Whisper model, measures RTF, and 
-    uses an initial prompt for improved accuracy.
+    Transcribes the given audio using the Whisper model, measures RTF, and 
+    uses an initial prompt for improved accuracy. 'audio_file' may be a WAV
+    path or a float32 16 kHz NumPy array (see record_audio).
+    'prompt_tokens' are the prompt's precompiled token ids (compiled deck);
+    the tutor_decoding paths use them instead of re-tokenizing 'prompt_text'.
+    With a StreamingTranscriber that was fed during recording, only its
+    final pass remains, so the time measured is the post-speech latency.
     
     Returns: A tuple (transcribed_text, transcribe_time, rtf)
     """
     
     # We use logging.info here to keep the main console clean
-    logging.info(f"Starting transcription for {audio_file}")
+    if isinstance(audio_file, str):
+        logging.info(f"Starting transcription for {audio_file}")
+    else:
+        logging.info(f"Starting transcription for {audio_duration:.2f}s in-memory recording")
 
     print("Transcribing audio with Whisper...Please Wait!")
 
@@ -308,11 +713,29 @@ def transcribe_audio(audio_file, model, language, prompt_text, audio_duration):
     
     # Transcribe the audio
     # The 'initial_prompt' guides the model toward the expected phrase, boosting accuracy.
-    result = model.transcribe(
-        audio_file, 
-        language=language,
-        initial_prompt=prompt_text
-    )
+    if streamer is not None:
+        result = {"text": streamer.finish(audio_file)}
+    elif (DECODE_PROFILE or DECK_CONSTRAINED) and tutor_decoding.is_whisper_model(model):
+        audio = tutor_stt.load_wav_16k(audio_file) if isinstance(audio_file, str) else audio_file
+        with MODEL_LOCK:
+            trie = get_deck_trie(model, language) if DECK_CONSTRAINED else None
+            decoded = tutor_decoding.decode_with_budget(model, audio, prompt_text, language, DECODE_PROFILE or "open",
+                                                        short=SHORT_AUDIO_MODE, max_retries=DECODE_MAX_RETRIES,
+                                                        trie=trie, expected_tokens=prompt_tokens)
+        result = {"text": decoded.text}
+        print(f"🔁 Decode: {decoded.steps} steps, {decoded.retries} retries (stopped: {decoded.stop_reason})")
+    elif SHORT_AUDIO_MODE and audio_duration <= tutor_decoding.SHORT_AUDIO_MAX_SECONDS \
+            and tutor_decoding.is_whisper_model(model):
+        audio = tutor_stt.load_wav_16k(audio_file) if isinstance(audio_file, str) else audio_file
+        with MODEL_LOCK:
+            result = tutor_decoding.transcribe_short(model, audio, language, prompt_text, prompt_tokens)
+    else:
+        with MODEL_LOCK:
+            result = model.transcribe(
+                audio_file, 
+                language=language,
+                initial_prompt=prompt_text
+            )
     
     end_time = time.time()
     
@@ -331,6 +754,489 @@ def transcribe_audio(audio_file, model, language, prompt_text, audio_duration):
     # NEW RETURN: Return the text AND the calculated speed metrics
     return result["text"], transcribe_time, rtf
 
+def get_deck_trie(model, language):
+    """Returns the deck's token trie, building it from TUTOR_CONTENT on first use."""
+    global DECK_TRIE
+    if DECK_TRIE is None:
+        start_time = time.time()
+        DECK_TRIE = tutor_decoding.build_deck_trie(model, [row['text'] for row in TUTOR_CONTENT], language)
+        logging.info(f"Deck trie: {DECK_TRIE.phrases} phrases in {time.time() - start_time:.2f}s")
+    return DECK_TRIE
+
+def supports_forced_scoring(model):
+    """True if 'model' exposes the whisper encoder/decoder needed for forced scoring."""
+    return tutor_decoding.is_whisper_model(model)
+
+def score_audio(audio_file, model, language, prompt_text, audio_duration):
+    """
+    Forced-alignment counterpart of transcribe_audio(): scores how well the
+    recording matches 'prompt_text' with one encoder pass and one
+    teacher-forced decoder pass, and reports time and RTF the same way.
+
+    Returns: A tuple (ForcedScore, transcribe_time, rtf)
+    """
+    print("Scoring your attempt against the expected phrase...Please Wait!")
+    audio = tutor_stt.load_wav_16k(audio_file) if isinstance(audio_file, str) else audio_file
+
+    start_time = time.time()
+    with MODEL_LOCK:
+        score = tutor_decoding.score_expected(model, audio, prompt_text, language, short=SHORT_AUDIO_MODE)
+    transcribe_time = time.time() - start_time
+    rtf = transcribe_time / audio_duration if audio_duration > 0 else float('inf')
+
+    print(f"⏱️ Transcription Time: {transcribe_time:.2f} seconds (RTF: {rtf:.2f})")
+    return score, transcribe_time, rtf
+
+# --- Streaming Transcription ---
+class StreamingTranscriber:
+    """
+    Decodes rolling windows of the recording on a background thread while the
+    learner is still speaking, and prints the partial transcript live.
+    record_audio() feeds it 16 kHz blocks via feed() (and the VAD trim via
+    set_clip()); transcribe_audio() calls finish(), which reuses the last
+    partial when it already covers the whole clip and otherwise runs one
+    short greedy pass.
+    """
+    def __init__(self, model, language, prompt_text,
+                 window_seconds=STREAM_WINDOW_SECONDS, interval=STREAM_INTERVAL_SECONDS):
+        self.model = model
+        self.language = language
+        self.prompt_text = prompt_text
+        self.window_samples = int(window_seconds * WHISPER_SAMPLE_RATE)
+        self.interval = interval
+        self.partial = ""
+        self.decode_count = 0
+        self._chunks = []
+        self._received = 0
+        self._decoded_samples = 0
+        self._clip = None # (start, end) of the final clip in the fed samples, if trimmed
+        self._lock = threading.Lock()
+        self._new_audio = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def feed(self, block):
+        """Adds a block of float32 16 kHz audio (called from the capture loop)."""
+        with self._lock:
+            self._chunks.append(block)
+            self._received += len(block)
+        self._new_audio.set()
+
+    def _decode(self, audio):
+        """Greedy, single-temperature decode used for partials and the final pass."""
+        with MODEL_LOCK:
+            result = self.model.transcribe(
+                audio,
+                language=self.language,
+                initial_prompt=self.prompt_text,
+                temperature=0.0,
+                condition_on_previous_text=False,
+                without_timestamps=True
+            )
+        return result["text"].strip()
+
+    def _run(self):
+        last_decode = 0.0
+        while not self._stop.is_set():
+            if not self._new_audio.wait(timeout=self.interval) or self._stop.is_set():
+                continue
+            # Throttle so decoding never falls further behind than one interval
+            delay = self.interval - (time.perf_counter() - last_decode)
+            if delay > 0 and self._stop.wait(delay):
+                break
+            self._new_audio.clear()
+
+            with self._lock:
+                audio = np.concatenate(self._chunks) if len(self._chunks) > 1 else self._chunks[0]
+                self._chunks = [audio]
+            if len(audio) < STREAM_MIN_SAMPLES:
+                continue
+
+            last_decode = time.perf_counter()
+            text = self._decode(audio[-self.window_samples:])
+            self.partial = text
+            self._decoded_samples = len(audio)
+            self.decode_count += 1
+            print(f"\r{YELLOW}… {text}{ENDC}\033[K", end="", flush=True)
+
+    def set_clip(self, start, end):
+        """The final clip is fed samples [start, end) (record_audio's VAD trim)."""
+        self._clip = (start, end)
+
+    def cancel(self):
+        """Stops the background decoder without a final pass."""
+        self._stop.set()
+        self._new_audio.set()
+        self._thread.join()
+
+    def finish(self, recording):
+        """
+        Stops streaming and returns the final transcript for 'recording'.
+        The last partial is reused if it covered (almost) the whole clip.
+        """
+        self.cancel()
+        print()
+        if isinstance(recording, str):
+            return self._decode(recording) # WAV path (IN_MEMORY_AUDIO off)
+        # Partials were decoded from the fed (untrimmed) samples; compare in those
+        start, end = self._clip if self._clip is not None else (0, len(recording))
+        undecoded = end - self._decoded_samples
+        if (self.decode_count and self._decoded_samples - self.window_samples <= start
+                and undecoded <= STREAM_REUSE_TAIL_SECONDS * WHISPER_SAMPLE_RATE):
+            return self.partial
+        return self._decode(recording)
+
+# --- Startup Helpers ---
+def timed_load(timeline, name, func, *args):
+    """Runs one startup step and records its (start, end) perf_counter times under 'name'."""
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        timeline[name] = (start, time.perf_counter())
+
+def print_startup_timeline(timeline, startup_start):
+    """Prints when each startup component began and finished, relative to launch."""
+    for name, (start, end) in sorted(timeline.items(), key=lambda item: item[1]):
+        print(f"   {name:<32} {start - startup_start:6.2f}s -> {end - startup_start:6.2f}s "
+              f"({end - start:.2f}s)")
+
+def report_model_ready(future, timeline, startup_start):
+    """Done-callback for the background STT model load."""
+    if future.exception() is None:
+        print(f"\n✅ Whisper model ready after {time.perf_counter() - startup_start:.2f}s")
+        print_startup_timeline({k: v for k, v in timeline.items() if k.startswith("stt-model")}, startup_start)
+
+def wait_for_model(model_future):
+    """Returns the loaded STT model, waiting only if it is still loading; None if loading failed."""
+    if not model_future.done():
+        print("⏳ Waiting for the Whisper model to finish loading...")
+    try:
+        return model_future.result()
+    except Exception as e:
+        print(f"FATAL: Could not load Whisper model. Error: {e}")
+        print(f"Ensure the package for the '{STT_BACKEND}' STT backend is installed.")
+        return None
+
+# --- Round Output Helpers ---
+def print_phrase_announcement(phrase_data):
+    """Prints the themed phrase block shown before the learner repeats it."""
+    print("\n" * 2)
+    print("=" * 50)
+    print(f"{BLUE}Phrase to Repeat:{ENDC} '{phrase_data['text']}'")
+    print(f"{RED}What you Hear:{ENDC} {phrase_data['notes']}")
+    print(f"{WHITE}What it Means:{ENDC} {phrase_data['translation']}")
+    if phrase_data.get('phonemes'):
+        print(f"{WHITE}Phonemes:{ENDC} /{phrase_data['phonemes']}/")
+    print("=" * 50)
+
+def print_round_feedback(correct_phrase, user_transcription, transcribe_time, rtf, target_words=None):
+    """
+    Compares the transcription with the target phrase and prints the results block.
+    'target_words' is the phrase's precomputed normalization (compiled deck).
+    """
+    # Simple normalization for robust comparison
+    if target_words is None:
+        target_words = tutor_deck.normalize_words(correct_phrase)
+    user_words = tutor_deck.normalize_words(user_transcription)
+
+    if user_words == target_words:
+        accuracy_color = GREEN
+        feedback = "PERFECT! (Match)"
+    else:
+        accuracy_color = YELLOW
+        feedback = "MISMATCH: Check your pronunciation."
+
+    print("\n" + "=" * 50)
+    print(f"{WHITE}⏱️ Transcription Time: {transcribe_time:.2f} seconds (RTF: {rtf:.2f}){ENDC}")
+    print("-" * 50)
+    print(f"{WHITE}WHISPER HEARD:{ENDC} {accuracy_color}{user_transcription}{ENDC}")
+    print(f"{accuracy_color}{feedback}{ENDC}")
+    print("=" * 50 + "\n")
+
+def align_words(target_words, user_words):
+    """
+    Minimum-edit alignment of the heard words against the target words.
+    Returns [(expected, heard)] pairs; a None side marks a missing or extra word.
+    """
+    rows, cols = len(target_words) + 1, len(user_words) + 1
+    cost = [[i + j if i == 0 or j == 0 else 0 for j in range(cols)] for i in range(rows)]
+    for i in range(1, rows):
+        for j in range(1, cols):
+            cost[i][j] = min(cost[i - 1][j] + 1, cost[i][j - 1] + 1,
+                             cost[i - 1][j - 1] + (target_words[i - 1] != user_words[j - 1]))
+
+    pairs = []
+    i, j = rows - 1, cols - 1
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and cost[i][j] == cost[i - 1][j - 1] + (target_words[i - 1] != user_words[j - 1]):
+            pairs.append((target_words[i - 1], user_words[j - 1]))
+            i, j = i - 1, j - 1
+        elif i > 0 and cost[i][j] == cost[i - 1][j] + 1:
+            pairs.append((target_words[i - 1], None))
+            i -= 1
+        else:
+            pairs.append((None, user_words[j - 1]))
+            j -= 1
+    return pairs[::-1]
+
+def score_comparison(correct_phrase, user_transcription, target_words=None):
+    """
+    Word accuracy of the transcription: 1 - word edit distance / target length
+    (0..1), on the same normalization as print_round_feedback().
+    Returns: A tuple (accuracy, alignment) with the align_words() pairs
+    """
+    if target_words is None:
+        target_words = tutor_deck.normalize_words(correct_phrase)
+    user_words = tutor_deck.normalize_words(user_transcription)
+    alignment = align_words(target_words, user_words)
+    if not target_words:
+        return (1.0 if not user_words else 0.0), alignment
+    errors = sum(1 for expected, heard in alignment if expected != heard)
+    return max(0.0, 1.0 - errors / len(target_words)), alignment
+
+def forced_accuracy(score):
+    """Word accuracy equivalent for a ForcedScore: share of confidently heard words."""
+    if score.passed or not score.word_scores:
+        return 1.0 if score.passed else 0.0
+    heard = sum(1 for _, prob in score.word_scores if prob >= tutor_decoding.FORCED_PASS_WORD_PROB)
+    return heard / len(score.word_scores)
+
+def record_review(phrase_data, accuracy):
+    """Feeds the round's word accuracy to the scheduler and prints when the phrase comes back."""
+    if SCHEDULER is None:
+        return
+    state = SCHEDULER.record_result(phrase_data, tutor_scheduler.quality_from_accuracy(accuracy))
+    if state.interval_days >= 1:
+        when = f"in {state.interval_days:.0f} day(s)"
+    else:
+        when = "later this session"
+    print(f"📅 Word accuracy {accuracy:.0%}; next review {when}")
+
+def phrase_log_id(text):
+    """
+    Stable id of a phrase in the results log: the first 16 hex digits of the
+    SHA-256 of its text. CSV, compiled-deck and phrase-store rows get the same
+    id (phrases are keyed by their text, as in the scheduler), and it survives
+    the deck being reordered.
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+def log_round(round_no, phrase_data, scoring, outcome, accuracy, alignment, audio, audio_duration,
+              transcribe_time, rtf):
+    """Queues the round's result on the results log (never blocks the loop)."""
+    if RESULTS_LOG is None:
+        return
+    record = {
+        "round": round_no, # Also names the saved recording, unique within the session
+        "phrase": phrase_data['text'],
+        "phrase_id": phrase_log_id(phrase_data['text']),
+        "scoring": scoring,
+        "accuracy": accuracy,
+        "alignment": alignment,
+        "audio_duration": audio_duration,
+        "transcribe_time": transcribe_time,
+        "rtf": rtf,
+    }
+    if isinstance(outcome, tutor_decoding.ForcedScore):
+        record["word_scores"] = outcome.word_scores
+        record["mean_logprob"] = outcome.mean_logprob
+    else:
+        record["transcript"] = outcome
+    keep_audio = RESULTS_KEEP_AUDIO and not isinstance(audio, str)
+    RESULTS_LOG.append(record, audio if keep_audio else None, WHISPER_SAMPLE_RATE)
+
+def print_forced_feedback(correct_phrase, score, transcribe_time, rtf):
+    """Prints the results block for forced-alignment scoring."""
+    accuracy_color = GREEN if score.passed else YELLOW
+    feedback = "PASS! (Expected phrase heard)" if score.passed else "MISMATCH: Check your pronunciation."
+
+    print("\n" + "=" * 50)
+    print(f"{WHITE}⏱️ Transcription Time: {transcribe_time:.2f} seconds (RTF: {rtf:.2f}){ENDC}")
+    print("-" * 50)
+    print(f"{WHITE}WORD CONFIDENCE:{ENDC} {get_confidence_highlight(score.word_scores)}")
+    print(f"{WHITE}Mean token log-prob:{ENDC} {score.mean_logprob:.2f}")
+    print(f"{accuracy_color}{feedback}{ENDC}")
+    print("=" * 50 + "\n")
+
+
+# --- Asyncio Pipeline Session ---
+def run_in_daemon_thread(func, *args):
+    """
+    Runs a blocking call on a daemon thread and returns an awaitable for its result.
+    Unlike asyncio.to_thread, a thread parked in input() cannot hold up exit
+    when the session is cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(result, error):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def runner():
+        result, error = None, None
+        try:
+            result = func(*args)
+        except BaseException as e:
+            error = e
+        try:
+            loop.call_soon_threadsafe(settle, result, error)
+        except RuntimeError:
+            pass # The session loop already closed (cancelled run)
+
+    threading.Thread(target=runner, daemon=True).start()
+    return future
+
+async def run_pipeline_session(model_future, content, max_rounds=None, queue_size=PIPELINE_QUEUE_SIZE,
+                               stream=False, scoring=SCORING_MODE):
+    """
+    Event-driven session: presentation, capture, transcription and feedback run
+    as separate asyncio stages joined by bounded queues, so round N is being
+    transcribed and scored while round N+1 is already presented.
+    Presentation and capture share the speaker/microphone, so they take turns
+    via 'floor'; transcription and feedback overlap freely with both.
+    A None item flows down the queues to drain the pipeline after 'max_rounds';
+    Ctrl+C cancels every stage instead. With 'stream', each capture is decoded
+    incrementally by a StreamingTranscriber that travels with the recording.
+    'model_future' is the background STT model load; only transcription waits on it.
+    """
+    presented_q = asyncio.Queue(maxsize=1)
+    captured_q = asyncio.Queue(maxsize=queue_size)
+    results_q = asyncio.Queue(maxsize=queue_size)
+    floor = asyncio.Semaphore(1)
+
+    round_started = {} # round_no -> perf_counter() at presentation, for the "round" span
+
+    async def traced(stage, round_no, func, *args):
+        """Runs a blocking stage on a daemon thread as one span of 'round_no'."""
+        start = time.perf_counter()
+        try:
+            return await run_in_daemon_thread(TRACER.bind(round_no, func), *args)
+        finally:
+            TRACER.record(stage, time.perf_counter() - start, round_no)
+
+    def finish_round(round_no):
+        TRACER.record("round", time.perf_counter() - round_started.pop(round_no), round_no)
+        TRACER.end_round()
+
+    async def presentation_stage():
+        round_no = 0
+        next_round = run_in_daemon_thread(prepare_round, content)
+        while max_rounds is None or round_no < max_rounds:
+            phrase_data, prerendered, timings = await next_round
+            round_no += 1
+            await floor.acquire()
+            round_started[round_no] = time.perf_counter()
+            for stage, seconds in timings.items():
+                TRACER.record(stage, seconds, round_no)
+            print_phrase_announcement(phrase_data)
+            await traced("playback", round_no, present_phrase, phrase_data['source'], prerendered)
+            print_playback_stats()
+            # Render the following round while this one is captured
+            next_round = run_in_daemon_thread(prepare_round, content)
+            await presented_q.put((round_no, phrase_data))
+        await presented_q.put(None)
+
+    async def capture_stage():
+        while (item := await presented_q.get()) is not None:
+            round_no, phrase_data = item
+            streamer = None
+            if (stream and scoring != "forced"
+                    and model_future.done() and model_future.exception() is None):
+                streamer = StreamingTranscriber(model_future.result(), LANGUAGE, phrase_data['text'])
+            try:
+                # record_audio() traces the ENTER wait and the capture as separate spans
+                result_tuple = await run_in_daemon_thread(TRACER.bind(round_no, record_audio),
+                    BLUE, RED, TEMP_AUDIO_FILE, streamer.feed if streamer else None,
+                    streamer.set_clip if streamer else None)
+            finally:
+                floor.release()
+            if result_tuple is None:
+                if streamer is not None:
+                    streamer.cancel()
+                if SCHEDULER is not None:
+                    SCHEDULER.release(phrase_data)
+                print(f"{WHITE}❌ Recording failed or was empty. Skipping transcription.{ENDC}")
+                finish_round(round_no)
+                continue
+            await captured_q.put((round_no, phrase_data, *result_tuple, streamer))
+        await captured_q.put(None)
+
+    def drop_capture(item):
+        """Discards a captured attempt that will never be transcribed."""
+        round_no, phrase_data, _, _, streamer = item
+        if streamer is not None:
+            streamer.cancel()
+        if SCHEDULER is not None:
+            SCHEDULER.release(phrase_data)
+        round_started.pop(round_no, None)
+
+    async def transcription_stage():
+        model = None
+        while (item := await captured_q.get()) is not None:
+            if model is None:
+                if not model_future.done():
+                    print("⏳ Waiting for the Whisper model to finish loading...")
+                    try:
+                        await asyncio.wrap_future(model_future)
+                    except Exception:
+                        pass # Reported by wait_for_model() below
+                model = wait_for_model(model_future) # Prints the FATAL message if loading failed
+                if model is None:
+                    # Nothing can be transcribed: stop presenting and drain what was captured
+                    for task in stages[:2]:
+                        task.cancel()
+                    drop_capture(item)
+                    while not captured_q.empty():
+                        if (item := captured_q.get_nowait()) is not None:
+                            drop_capture(item)
+                    break
+            round_no, phrase_data, audio, audio_duration, streamer = item
+            if scoring == "forced" and supports_forced_scoring(model):
+                outcome, transcribe_time, rtf = await traced("transcription", round_no,
+                    score_audio, audio, model, LANGUAGE, phrase_data['text'], audio_duration)
+            else:
+                outcome, transcribe_time, rtf = await traced("transcription", round_no,
+                    transcribe_audio, audio, model, LANGUAGE, phrase_data['text'], audio_duration, streamer,
+                    phrase_data.get('prompt_tokens'))
+            await results_q.put((round_no, phrase_data, outcome, transcribe_time, rtf, audio, audio_duration))
+        await results_q.put(None)
+
+    async def feedback_stage():
+        while (item := await results_q.get()) is not None:
+            round_no, phrase_data, outcome, transcribe_time, rtf, audio, audio_duration = item
+            print(f"{WHITE}--- Round {round_no} results ---{ENDC}")
+            with TRACER.span("comparison", round_no):
+                if isinstance(outcome, tutor_decoding.ForcedScore):
+                    print_forced_feedback(phrase_data['text'], outcome, transcribe_time, rtf)
+                    accuracy, alignment = forced_accuracy(outcome), None
+                else:
+                    print_round_feedback(phrase_data['text'], outcome, transcribe_time, rtf, phrase_data.get('words'))
+                    accuracy, alignment = score_comparison(phrase_data['text'], outcome, phrase_data.get('words'))
+            record_review(phrase_data, accuracy)
+            log_round(round_no, phrase_data, scoring, outcome, accuracy, alignment, audio, audio_duration,
+                      transcribe_time, rtf)
+            finish_round(round_no)
+
+    stages = [asyncio.create_task(stage()) for stage in
+              (presentation_stage, capture_stage, transcription_stage, feedback_stage)]
+    try:
+        # The first failure cancels the rest instead of leaving them parked on a queue
+        done, pending = await asyncio.wait(stages, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if not task.cancelled(): # Cancelled by transcription_stage when the model failed to load
+                task.result()
+    finally:
+        for task in stages:
+            task.cancel()
+        await asyncio.gather(*stages, return_exceptions=True)
+
 def main():
     """The main language practice loop."""
     global TUTOR_CONTENT
@@ -341,10 +1247,22 @@ def main():
     print("--- French Pronunciation & Listening Tutor ---")
 
 # --- Main Application Loop ---
-def main():
-    """The main language practice loop."""
+def main(prewarm=False, pipeline=False, rounds=None, stream=False, scoring=SCORING_MODE):
+    """
+    The main language practice loop.
+    With 'prewarm', every deck phrase is rendered into the TTS cache before starting.
+    With 'pipeline', the session runs on the asyncio stage pipeline instead
+    (see run_pipeline_session), optionally stopping after 'rounds' phrases.
+    With 'stream', attempts are transcribed incrementally while the learner speaks.
+    'scoring' selects free transcription or forced-alignment scoring (SCORING_MODE).
+    """
     global TUTOR_CONTENT
     global PIPER_VOICE 
+    global AUDIO_PLAYER
+    global SCHEDULER
+    global RESULTS_LOG
+    global CAPTURE_ENGINE
+    global TRACER
     
     # Define colors here (or ensure they are defined globally)
     BLUE = '\033[94m'
@@ -360,14 +1278,25 @@ def main():
 
     print("--- French Pronunciation & Listening Tutor ---")
     
+    # --- PARALLEL STARTUP ---
+    # Piper, the deck and the STT model load concurrently; the first phrase only
+    # needs Piper and the deck, and only the first transcription waits on the model.
+    startup_start = time.perf_counter()
+    timeline = {}
+    startup_pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup")
+    print("Loading Piper Voice Model, tutor content and Whisper model in parallel...")
+    piper_future = startup_pool.submit(timed_load, timeline, "piper-voice",
+                                       load_piper_voice, PIPER_MODEL_PATH, PIPER_CONFIG_PATH)
+    content_future = startup_pool.submit(timed_load, timeline, "tutor-content",
+                                         load_tutor_content, TUTOR_CONTENT_FILE)
+    stt_backend = tutor_stt.select_backend(STT_BACKEND, STT_USE_DAEMON)
+    model_future = startup_pool.submit(timed_load, timeline, f"stt-model ({stt_backend} {MODEL_NAME})",
+                                       tutor_stt.load_backend, stt_backend, MODEL_NAME)
+    startup_pool.shutdown(wait=False)
+
     # --- LOAD PIPER VOICE ---
     try:
-        print("Loading Piper Voice Model...")
-        PIPER_VOICE = PiperVoice.load(
-            PIPER_MODEL_PATH, 
-            PIPER_CONFIG_PATH
-        )
-        
+        PIPER_VOICE = piper_future.result()
         speaker_name = "Jessica" if PIPER_SPEAKER_ID == JESSICA_ID else "Pierre"
         print(f"✅ Piper Model loaded successfully with speaker: {speaker_name}")
     except Exception as e:
@@ -375,87 +1304,164 @@ def main():
         print("Ensure your MODEL_PATH and CONFIG_PATH variables are correct.")
         return
 
+    # --- OPEN AUDIO OUTPUT ---
+    try:
+        AUDIO_PLAYER = timed_load(timeline, "audio-output", tutor_audio.AudioPlayer, piper_sample_rate(PIPER_VOICE))
+    except Exception as e:
+        print(f"FATAL: Could not open the audio output device. Error: {e}")
+        return
+
+    # --- OPEN AUDIO INPUT (kept open for the whole session) ---
+    try:
+        CAPTURE_ENGINE = timed_load(timeline, "audio-input", open_capture_engine)
+    except Exception as e:
+        print(f"FATAL: Could not open the microphone. Error: {e}")
+        return
+
     # --- LOAD CONTENT ---
-    TUTOR_CONTENT = load_tutor_content(TUTOR_CONTENT_FILE)
+    TUTOR_CONTENT = content_future.result()
     if not TUTOR_CONTENT:
         print("\nFATAL: Could not load tutor content. Exiting.")
         return
-        
-    print(f"Loading Whisper model: {MODEL_NAME}...")
-    try:
-        model = whisper.load_model(MODEL_NAME)
-        print("Model loaded successfully.")
-    except Exception as e:
-        print(f"FATAL: Could not load Whisper model. Error: {e}")
-        print("Ensure 'pip install whisper' was successful.")
+
+    # --- SPACED-REPETITION SCHEDULE ---
+    if USE_SCHEDULER:
+        try:
+            SCHEDULER = tutor_scheduler.Scheduler(TUTOR_CONTENT, SCHEDULE_FILE)
+            print(f"📅 {SCHEDULER.due_count()} reviews due, {len(SCHEDULER.states)} phrases scheduled")
+        except Exception as e:
+            print(f"⚠️ Could not open the review schedule ({e}); picking phrases at random.")
+
+    # --- ROUND TRACING ---
+    if TRACE_ENABLED:
+        try:
+            TRACER = tutor_trace.Tracer(TRACE_FILE, TRACE_PROM_FILE)
+        except Exception as e:
+            print(f"⚠️ Could not open the trace file ({e}); stages will not be traced.")
+
+    # --- RESULTS LOG ---
+    if RESULTS_LOG_ENABLED:
+        try:
+            RESULTS_LOG = tutor_results.ResultsLog(RESULTS_DIR)
+        except Exception as e:
+            print(f"⚠️ Could not open the results log ({e}); results will not be saved.")
+
+    # --- PRE-WARM TTS CACHE (overlaps the Whisper load) ---
+    if prewarm:
+        timed_load(timeline, "tts-prewarm", prewarm_tts_cache, TUTOR_CONTENT)
+
+    print(f"🚀 Ready for the first phrase after {time.perf_counter() - startup_start:.2f}s")
+    print_startup_timeline(timeline, startup_start)
+    model_future.add_done_callback(
+        lambda future: report_model_ready(future, timeline, startup_start))
+
+    if pipeline:
+        try:
+            asyncio.run(run_pipeline_session(model_future, TUTOR_CONTENT, max_rounds=rounds,
+                                             stream=stream, scoring=scoring))
+        except KeyboardInterrupt:
+            print("\nSession interrupted.")
+        finally:
+            AUDIO_PLAYER.close()
+            CAPTURE_ENGINE.close()
+            if RESULTS_LOG is not None:
+                RESULTS_LOG.close() # Flushes the last batch
+            tutor_trace.print_stage_summary(TRACER.summary())
+            TRACER.close()
+            print("--- Session ended. Au revoir! ---")
         return
 
+    # Single worker that prepares the next round while the current one is transcribed
+    prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-prefetch")
+    next_round = prefetch_pool.submit(prepare_round, TUTOR_CONTENT)
+
     input("Press Enter to start the first practice session...")
     
     # Main game loop
+    round_no = 0
     while True:
-        # 1. Select and announce the phrase
-        phrase_data = random.choice(TUTOR_CONTENT)
+        # 1. Select and announce the phrase (picked and synthesized by the prefetch worker)
+        round_no += 1
+        round_start = wait_start = time.perf_counter()
+        phrase_data, prerendered, timings = next_round.result()
+        prefetch_wait = time.perf_counter() - wait_start
+        for stage, seconds in timings.items():
+            TRACER.record(stage, seconds, round_no)
         
         correct_phrase = phrase_data['text']
-        notes = phrase_data['notes']
-        translation = phrase_data['translation']
 
         # --- PHRASE ANNOUNCEMENT OUTPUT (Themed) ---
-        print("\n" * 2)
-        print("=" * 50)
-        print(f"{BLUE}Phrase to Repeat:{ENDC} '{correct_phrase}'")
-        print(f"{RED}What you Hear:{ENDC} {notes}")
-        print(f"{WHITE}What it Means:{ENDC} {translation}")
-        print("=" * 50)
+        print_phrase_announcement(phrase_data)
         
-        # Present the phrase (TTS)
-        speak_text(correct_phrase) 
+        # Present the phrase ("Répétez" + TTS or audio file, played back to back)
+        with TRACER.span("playback", round_no):
+            present_phrase(phrase_data['source'], prerendered)
+        print_playback_stats()
+        print(f"⏩ Prefetch: TTS {timings['tts'] * 1000:.0f} ms overlapped, waited {prefetch_wait * 1000:.0f} ms")
         
-        # 2. Record user's attempt using PTT
-        result_tuple = record_audio(BLUE, RED) 
+        # 2. Record user's attempt using PTT (optionally decoding it as it arrives)
+        # (Streaming starts once the model has finished loading in the background.)
+        streamer = None
+        if (stream and scoring != "forced"
+                and model_future.done() and model_future.exception() is None):
+            streamer = StreamingTranscriber(model_future.result(), LANGUAGE, correct_phrase)
+        with TRACER.round(round_no): # Spans "prompt_wait" and "capture"
+            result_tuple = record_audio(BLUE, RED, on_block=streamer.feed if streamer else None,
+                                        on_trim=streamer.set_clip if streamer else None)
+
+        # Start preparing the next round while this attempt is transcribed
+        next_round = prefetch_pool.submit(prepare_round, TUTOR_CONTENT)
 
         # Handle recording failure
         if result_tuple is None:
+            if streamer is not None:
+                streamer.cancel()
+            if SCHEDULER is not None:
+                SCHEDULER.release(phrase_data)
             print(f"{WHITE}❌ Recording failed or was empty. Skipping transcription.{ENDC}") 
+            TRACER.record("round", time.perf_counter() - round_start, round_no)
+            TRACER.end_round()
             continue
 
-        # UNPACK FILENAME AND DURATION
+        # UNPACK AUDIO (array or filename) AND DURATION
         audio_file, audio_duration = result_tuple 
 
-        # 3. Transcribe and compare
-        # FIX: UNPACK ALL THREE RETURN VALUES (text, time, rtf)
-        user_transcription, transcribe_time, rtf = transcribe_audio(audio_file, model, LANGUAGE, correct_phrase, audio_duration)
-        
-        
-        # --- CLEANED UP RESULTS OUTPUT ---
-        
-        # 3a. Simple normalization for robust comparison
-        import re
-        target_normalized = re.sub(r'[^\w\s]', '', correct_phrase).lower().strip()
-        user_normalized = re.sub(r'[^\w\s]', '', user_transcription).lower().strip()
-        
-        if user_normalized == target_normalized:
-            accuracy_color = GREEN
-            feedback = "PERFECT! (Match)"
+        # 3. Transcribe and compare (the first round may still wait for the model)
+        model = wait_for_model(model_future)
+        if model is None:
+            break
+
+        if scoring == "forced" and not supports_forced_scoring(model):
+            print(f"{YELLOW}Forced scoring needs the 'whisper' STT backend; using transcription.{ENDC}")
+            scoring = "transcribe"
+
+        if scoring == "forced":
+            # Score the expected phrase directly (one encoder + one decoder pass)
+            with TRACER.span("transcription", round_no):
+                score, transcribe_time, rtf = score_audio(audio_file, model, LANGUAGE, correct_phrase, audio_duration)
+            with TRACER.span("comparison", round_no):
+                print_forced_feedback(correct_phrase, score, transcribe_time, rtf)
+            record_review(phrase_data, forced_accuracy(score))
+            log_round(round_no, phrase_data, scoring, score, forced_accuracy(score), None, audio_file,
+                      audio_duration, transcribe_time, rtf)
         else:
-            accuracy_color = YELLOW
-            feedback = "MISMATCH: Check your pronunciation."
+            # FIX: UNPACK ALL THREE RETURN VALUES (text, time, rtf)
+            with TRACER.span("transcription", round_no):
+                user_transcription, transcribe_time, rtf = transcribe_audio(audio_file, model, LANGUAGE, correct_phrase, audio_duration, streamer,
+                                                                            phrase_data.get('prompt_tokens'))
 
-        # 3b. Print the results block
-        print("\n" + "=" * 50)
-        
-        # Print speed metrics (Variables are now defined due to the unpacking above)
-        print(f"{WHITE}⏱️ Transcription Time: {transcribe_time:.2f} seconds (RTF: {rtf:.2f}){ENDC}")
-        print("-" * 50)
-        
-        print(f"{WHITE}WHISPER HEARD:{ENDC} {accuracy_color}{user_transcription}{ENDC}") 
-        print(f"{accuracy_color}{feedback}{ENDC}")
-        print("=" * 50 + "\n")
-        # ---------------------------------
+            # --- CLEANED UP RESULTS OUTPUT ---
+            with TRACER.span("comparison", round_no):
+                print_round_feedback(correct_phrase, user_transcription, transcribe_time, rtf, phrase_data.get('words'))
+                accuracy, alignment = score_comparison(correct_phrase, user_transcription, phrase_data.get('words'))
+            record_review(phrase_data, accuracy)
+            log_round(round_no, phrase_data, scoring, user_transcription, accuracy, alignment, audio_file,
+                      audio_duration, transcribe_time, rtf)
+
+        TRACER.record("round", time.perf_counter() - round_start, round_no)
+        TRACER.end_round()
 
         # 4. Clean up and prompt next action
-        import os
         if os.path.exists(TEMP_AUDIO_FILE):
              os.remove(TEMP_AUDIO_FILE)
         
@@ -463,8 +1469,64 @@ def main():
         if action == 'q' or action == 'quit':
             break
 
+    prefetch_pool.shutdown(wait=False, cancel_futures=True)
+    AUDIO_PLAYER.close()
+    CAPTURE_ENGINE.close()
+    if RESULTS_LOG is not None:
+        RESULTS_LOG.close() # Flushes the last batch
+    tutor_trace.print_stage_summary(TRACER.summary())
+    TRACER.close()
     print("--- Session ended. Au revoir! ---")
 
 if __name__ == "__main__":
     import random
-    main()
+    parser = argparse.ArgumentParser(description="French Pronunciation & Listening Tutor (Raspberry Pi)")
+    parser.add_argument("--prewarm", action="store_true",
+                        help="render every deck phrase into the TTS cache (in parallel) before starting")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="overlap presentation/capture with transcription/feedback (asyncio stages)")
+    parser.add_argument("--rounds", type=int, default=None,
+                        help="stop the --pipeline session after this many phrases")
+    parser.add_argument("--stream", action="store_true",
+                        help="transcribe incrementally while the learner is still speaking")
+    parser.add_argument("--scoring", choices=("transcribe", "forced"), default=SCORING_MODE,
+                        help="free transcription, or forced-alignment scoring of the expected phrase")
+    parser.add_argument("--short-audio", action="store_true", default=SHORT_AUDIO_MODE,
+                        help="encode only the recording's real duration instead of a 30 s window")
+    parser.add_argument("--decode-profile", choices=sorted(tutor_decoding.DECODE_PROFILES), default=DECODE_PROFILE,
+                        help="bound decoding by the expected phrase's length and stop early on a match/divergence")
+    parser.add_argument("--max-retries", type=int, default=DECODE_MAX_RETRIES,
+                        help="cap the temperature-fallback retries of --decode-profile (0 disables fallback)")
+    parser.add_argument("--deck-constrained", action="store_true", default=DECK_CONSTRAINED,
+                        help="only allow transcriptions that are phrases of the deck (vocabulary trie mask)")
+    parser.add_argument("--store", default=PHRASE_STORE_FILE,
+                        help="practice from an indexed phrase store (tutor_store.py) instead of the CSV")
+    parser.add_argument("--tag", action="append", default=list(PHRASE_TAGS),
+                        help="only phrases with this tag (repeatable; needs --store)")
+    parser.add_argument("--phrase-language", default=PHRASE_LANGUAGE,
+                        help="only phrases in this language code (needs --store)")
+    parser.add_argument("--min-difficulty", type=int, default=PHRASE_MIN_DIFFICULTY,
+                        help="lowest phrase difficulty (needs --store)")
+    parser.add_argument("--max-difficulty", type=int, default=PHRASE_MAX_DIFFICULTY,
+                        help="highest phrase difficulty (needs --store)")
+    parser.add_argument("--no-trace", action="store_true",
+                        help="don't record per-stage round spans")
+    parser.add_argument("--keep-audio", action="store_true", default=RESULTS_KEEP_AUDIO,
+                        help="keep every recording as a WAV next to the results log")
+    parser.add_argument("--no-schedule", action="store_true",
+                        help="pick phrases at random instead of by spaced repetition")
+    args = parser.parse_args()
+    USE_SCHEDULER = USE_SCHEDULER and not args.no_schedule
+    RESULTS_KEEP_AUDIO = args.keep_audio
+    TRACE_ENABLED = TRACE_ENABLED and not args.no_trace
+    PHRASE_STORE_FILE = args.store
+    PHRASE_TAGS = args.tag
+    PHRASE_LANGUAGE = args.phrase_language
+    PHRASE_MIN_DIFFICULTY = args.min_difficulty
+    PHRASE_MAX_DIFFICULTY = args.max_difficulty
+    SHORT_AUDIO_MODE = args.short_audio
+    DECK_CONSTRAINED = args.deck_constrained
+    DECODE_PROFILE = args.decode_profile
+    DECODE_MAX_RETRIES = args.max_retries
+    main(prewarm=args.prewarm, pipeline=args.pipeline, rounds=args.rounds, stream=args.stream,
+         scoring=args.scoring)
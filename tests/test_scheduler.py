@@ -0,0 +1,67 @@
+import csv
+import tutor_store
+import tutor_scheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def write_csv(path, texts, tags=None):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["text", "source", "translation", "notes", "tags"])
+        writer.writeheader()
+        for i, text in enumerate(texts):
+            writer.writerow({"text": text, "source": "tts", "translation": "", "notes": "",
+                             "tags": tags(i) if tags else ""})
+
+
+def test_every_new_phrase_is_introduced_once(tmp_path):
+    content = [{"text": f"phrase {i}"} for i in range(50)]
+    scheduler = tutor_scheduler.Scheduler(content, str(tmp_path / "schedule.db"), Clock())
+    seen = set()
+    for _ in range(50):
+        row = scheduler.next_item()
+        assert row['text'] not in seen
+        seen.add(row['text'])
+        scheduler.record_result(row, 5)
+    assert len(seen) == 50
+    assert not scheduler._new
+
+
+def test_released_phrase_returns_to_the_pool(tmp_path):
+    content = [{"text": "un"}, {"text": "deux"}]
+    scheduler = tutor_scheduler.Scheduler(content, str(tmp_path / "schedule.db"), Clock())
+    row = scheduler.next_item()
+    scheduler.release(row)
+    assert len(scheduler._new) == 2
+
+
+def test_store_state_survives_a_tag_change(tmp_path):
+    csv_path, db_path = tmp_path / "deck.csv", str(tmp_path / "deck.db")
+    write_csv(csv_path, [f"phrase {i}" for i in range(20)], tags=lambda i: "even" if i % 2 == 0 else "odd")
+    store = tutor_store.PhraseStore(db_path)
+    store.import_csv(str(csv_path))
+    clock = Clock()
+    schedule = str(tmp_path / "schedule.db")
+
+    # Review every "even" phrase and fail one, so it comes due again soon
+    scheduler = tutor_scheduler.Scheduler(store.select(tags=["even"]), schedule, clock)
+    failed = None
+    for _ in range(10):
+        row = scheduler.next_item()
+        scheduler.record_result(row, 5 if failed else 0)
+        failed = failed or row
+    scheduler.close()
+
+    # The whole deck: positions differ, but the failed phrase is found by its store id
+    clock.now += tutor_scheduler.LAPSE_DELAY_SECONDS + 1
+    scheduler = tutor_scheduler.Scheduler(store.select(), schedule, clock)
+    assert len(scheduler._new) == 10
+    row = scheduler.next_item()
+    assert row['id'] == failed['id']
+    scheduler.close()
@@ -0,0 +1,39 @@
+import sqlite3
+import tutor_store
+
+CSV = "text,source,translation,notes\nbonjour,tts,hello,\nmerci,tts,thanks,\n"
+
+
+def test_reimport_is_idempotent(tmp_path):
+    csv_path, db_path = tmp_path / "deck.csv", str(tmp_path / "deck.db")
+    csv_path.write_text(CSV, encoding="utf-8")
+    store = tutor_store.PhraseStore(db_path)
+    store.import_csv(str(csv_path), tags=["basics"])
+    ids = list(store.select().ids)
+    store.import_csv(str(csv_path), difficulty=2, tags=["review"])
+    assert list(store.select().ids) == ids
+    assert store.stats() == ([("fr", 2)], [("basics", 2), ("review", 2)])
+    assert store.fetch(ids[0])['difficulty'] == 2
+    store.close()
+
+
+def test_same_text_in_another_language_is_a_new_phrase(tmp_path):
+    csv_path, db_path = tmp_path / "deck.csv", str(tmp_path / "deck.db")
+    csv_path.write_text(CSV, encoding="utf-8")
+    store = tutor_store.PhraseStore(db_path)
+    store.import_csv(str(csv_path))
+    store.import_csv(str(csv_path), language="en")
+    assert store.stats()[0] == [("en", 2), ("fr", 2)]
+    store.close()
+
+
+def test_duplicates_from_older_imports_are_removed(tmp_path):
+    db_path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript(tutor_store.SCHEMA)
+    conn.executemany("INSERT INTO phrases (text, language) VALUES (?, ?)", [("bonjour", "fr")] * 3)
+    conn.commit()
+    conn.close()
+    store = tutor_store.PhraseStore(db_path)
+    assert len(store.select()) == 1
+    store.close()
@@ -0,0 +1,50 @@
+import numpy as np
+import language_tutor_rpi as tutor
+
+RATE = tutor.WHISPER_SAMPLE_RATE
+BLOCK = 1024
+
+
+def synthetic_clip(amplitude, lead_seconds, speech_seconds=4.5, tail_seconds=1.5, noise_rms=0.002):
+    """Noise floor plus a 220 Hz tone whose level swings +-25% at 4 Hz (syllables). Returns (clip, start, end)."""
+    rng = np.random.default_rng(0)
+    clip = rng.normal(0.0, noise_rms, int((lead_seconds + speech_seconds + tail_seconds) * RATE))
+    start, end = int(lead_seconds * RATE), int((lead_seconds + speech_seconds) * RATE)
+    t = np.arange(end - start) / RATE
+    envelope = 0.75 + 0.25 * np.sin(2 * np.pi * 4 * t)
+    clip[start:end] += amplitude * np.sqrt(2) * envelope * np.sin(2 * np.pi * 220 * t)
+    return clip.astype(np.float32), start, end
+
+
+def run_vad(clip):
+    """Feeds 'clip' block by block like record_audio(); returns (vad, sample where it reported the end)."""
+    vad = tutor.EnergyVAD(RATE)
+    for offset in range(0, len(clip), BLOCK):
+        if vad.process(clip[offset:offset + BLOCK]):
+            return vad, offset + BLOCK
+    return vad, None
+
+
+def test_long_soft_phrase_is_not_cut():
+    for amplitude in (0.01, 0.02, 0.05):
+        clip, start, end = synthetic_clip(amplitude, lead_seconds=0.3)
+        vad, stopped_at = run_vad(clip)
+        assert stopped_at is None or stopped_at >= end, amplitude
+        trim_start, trim_end = vad.trim_bounds(len(clip))
+        assert trim_start <= start and trim_end >= end, amplitude
+
+
+def test_speech_inside_preroll_is_kept():
+    for amplitude in (0.02, 0.05):
+        clip, start, end = synthetic_clip(amplitude, lead_seconds=0.0)
+        vad, stopped_at = run_vad(clip)
+        bounds = vad.trim_bounds(len(clip))
+        assert bounds is not None, amplitude
+        assert bounds[0] == 0 and bounds[1] >= end, amplitude
+        assert stopped_at is None or stopped_at >= end, amplitude
+
+
+def test_silence_has_no_speech():
+    clip, _, _ = synthetic_clip(0.0, lead_seconds=0.3)
+    vad, _ = run_vad(clip)
+    assert vad.trim_bounds(len(clip)) is None
@@ -0,0 +1,427 @@
+import os
+import math
+import wave
+import time
+import logging
+import threading
+import collections
+import numpy as np
+
+# --- SHARED AUDIO HELPERS ---
+# Resampling, microphone-rate selection, the gapless output player and the
+# always-open capture ring used by both tutor scripts and the offline tools (benchmark, loopback, decoding
+# benchmark). Only NumPy is needed at import time; sounddevice is imported
+# when a device is queried or opened.
+
+WHISPER_SAMPLE_RATE = 16000 # Whisper's native input rate (whisper.audio.SAMPLE_RATE)
+FALLBACK_SAMPLE_RATE = 44100 # Device rate if the mic can't open at 16 kHz and has no default
+CAPTURE_RING_SECONDS = 30.0   # Ring buffer length (must exceed a recording plus its pre-roll)
+CAPTURE_PREROLL_SECONDS = 0.3 # Audio from before ENTER kept at the start of each recording
+CAPTURE_BLOCK_SIZE = 1024     # Device frames per callback (starting value)
+CAPTURE_MIN_BLOCK_SIZE = 512  # Block size adapts within these bounds:
+CAPTURE_MAX_BLOCK_SIZE = 4096 # doubled after a recording with overruns,
+CAPTURE_SHRINK_AFTER = 5      # halved after this many clean recordings
+
+
+class StreamingResampler:
+    """
+    Vectorized polyphase FIR resampler that converts audio block by block as it
+    arrives, e.g. 44100 Hz or 48000 Hz microphone input down to Whisper's 16 kHz.
+    The filter delay is compensated, so process() + flush() returns exactly
+    len(input) * out_rate / in_rate samples aligned with the input.
+    """
+    def __init__(self, in_rate, out_rate, taps_per_phase=32, beta=8.0):
+        g = math.gcd(int(in_rate), int(out_rate))
+        self.up = int(out_rate) // g
+        self.down = int(in_rate) // g
+        self.taps = taps_per_phase
+
+        # Kaiser-windowed sinc low-pass at the narrower of the two Nyquist bands
+        n_taps = self.taps * self.up
+        cutoff = 0.475 / max(self.up, self.down)
+        t = np.arange(n_taps) - (n_taps - 1) / 2
+        h = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(n_taps, beta)
+        h *= self.up / h.sum()
+        # Polyphase bank: bank[phase, k] = h[phase + k * up]
+        self._bank = h.reshape(self.taps, self.up).T.astype(np.float32)
+        self._offsets = np.arange(self.taps)
+
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        self._in_total = 0
+        self._next_out = 0
+        self._emitted = 0
+        self._skip = int(round((n_taps - 1) / 2 / self.down))
+
+    def process(self, block):
+        """Resamples one block of mono float32 audio and returns the new output samples."""
+        block = np.asarray(block, dtype=np.float32).reshape(-1)
+        buf = np.concatenate((self._history, block))
+        buf_start = self._in_total - (self.taps - 1)
+        self._in_total += len(block)
+
+        # Every output whose newest input sample has now arrived
+        n_end = -(-self._in_total * self.up // self.down)
+        n = np.arange(self._next_out, n_end)
+        self._next_out = n_end
+        base = (n * self.down) // self.up - buf_start
+        phase = (n * self.down) % self.up
+        window = buf[base[:, None] - self._offsets]
+        out = np.einsum('ij,ij->i', window, self._bank[phase])
+
+        self._history = buf[len(buf) - (self.taps - 1):]
+        if self._skip:
+            drop = min(self._skip, len(out))
+            out = out[drop:]
+            self._skip -= drop
+        self._emitted += len(out)
+        return out
+
+    def flush(self):
+        """Pushes the filter tail through and returns the remaining output samples."""
+        expected = int(round(self._in_total * self.up / self.down))
+        emitted = self._emitted
+        tail = self.process(np.zeros(self.taps, dtype=np.float32))
+        return tail[:max(0, expected - emitted)]
+
+
+def resample(audio, in_rate, out_rate=WHISPER_SAMPLE_RATE):
+    """Resamples a whole float32 clip in one go (returned unchanged if the rates match)."""
+    if int(in_rate) == int(out_rate):
+        return audio
+    resampler = StreamingResampler(in_rate, out_rate)
+    return np.concatenate((resampler.process(audio), resampler.flush()))
+
+
+def choose_capture_rate(fallback_rate=FALLBACK_SAMPLE_RATE):
+    """
+    Returns the rate to open the microphone at: Whisper's native 16 kHz when the
+    device supports it, otherwise the device default (resampled block by block).
+    """
+    import sounddevice as sd
+
+    try:
+        sd.check_input_settings(samplerate=WHISPER_SAMPLE_RATE, channels=1, dtype='float32')
+        return WHISPER_SAMPLE_RATE
+    except Exception:
+        try:
+            return int(sd.query_devices(kind='input')['default_samplerate'])
+        except Exception:
+            return fallback_rate
+
+
+def print_capture_stats(recording, device_rate, resample_cpu, legacy_rate=FALLBACK_SAMPLE_RATE):
+    """
+    Reports the bytes actually held for 'recording' and the CPU our block
+    resampler spent on it. The old path's figure (int16 at 'legacy_rate' plus
+    the float32 copy made for Whisper) is an estimate, not a measurement, and
+    the CPU Whisper's own resampling took on that path is not measured at all.
+    """
+    audio_duration = len(recording) / WHISPER_SAMPLE_RATE
+    legacy_bytes = int(audio_duration * legacy_rate) * (2 + 4)
+    cpu_ms = 1000 * resample_cpu / audio_duration if audio_duration > 0 else 0.0
+    print(f"📉 Capture: {device_rate} Hz -> {WHISPER_SAMPLE_RATE} Hz float32 | "
+          f"{recording.nbytes / 1024:.0f} KiB held (old path est. {legacy_bytes / 1024:.0f} KiB) | "
+          f"resample cost {cpu_ms:.1f} ms CPU per second of speech")
+
+
+def read_wav_samples(file_path):
+    """Reads a 16-bit PCM WAV file into (mono float32 samples, sample_rate)."""
+    with wave.open(file_path, 'rb') as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"Only 16-bit PCM WAV files are supported: {file_path}")
+        channels = wf.getnchannels()
+        sample_rate = wf.getframerate()
+        frames = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    samples = frames.reshape(-1, channels).mean(axis=1) / 32768.0
+    return samples.astype(np.float32), sample_rate
+
+
+# --- AUDIO OUTPUT ENGINE ---
+class AudioClip:
+    """A queued clip: float32 mono samples plus a completion event."""
+    def __init__(self, samples, label=""):
+        self.samples = samples
+        self.label = label
+        self.position = 0
+        self.done = threading.Event()
+        self.queued_at = time.perf_counter()
+        self.finished_at = None
+
+
+class AudioPlayer:
+    """
+    In-process, gapless audio output: one persistent sounddevice OutputStream
+    whose callback drains a queue of clips back to back. Replaces the per-clip
+    aplay/afplay subprocess, the temporary WAV and the fixed time.sleep(0.5).
+    """
+    def __init__(self, sample_rate, blocksize=512):
+        self.sample_rate = int(sample_rate)
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._finished = []
+        import sounddevice as sd
+        self._stream = sd.OutputStream(samplerate=self.sample_rate, channels=1, dtype='float32',
+                                       blocksize=blocksize, callback=self._callback)
+        self._stream.start()
+
+    def _callback(self, outdata, frames, time_info, status):
+        """Fills each output block from the head of the clip queue (audio thread)."""
+        out = outdata[:, 0]
+        filled = 0
+        with self._lock:
+            while filled < frames and self._queue:
+                clip = self._queue[0]
+                n = min(frames - filled, len(clip.samples) - clip.position)
+                out[filled:filled + n] = clip.samples[clip.position:clip.position + n]
+                clip.position += n
+                filled += n
+                if clip.position >= len(clip.samples):
+                    self._queue.popleft()
+                    clip.finished_at = time.perf_counter()
+                    clip.done.set()
+        out[filled:] = 0.0
+
+    def enqueue(self, samples, sample_rate, label=""):
+        """Queues float32 or int16 mono samples for playback and returns the AudioClip."""
+        samples = np.asarray(samples)
+        if samples.dtype == np.int16:
+            samples = samples.astype(np.float32) / 32768.0
+        samples = samples.astype(np.float32, copy=False).reshape(-1)
+        samples = resample(samples, sample_rate, self.sample_rate)
+        clip = AudioClip(samples, label)
+        with self._lock:
+            self._queue.append(clip)
+            self._finished.append(clip)
+        return clip
+
+    def enqueue_silence(self, seconds):
+        """Queues a short silent gap (e.g. between the prompt and the phrase)."""
+        return self.enqueue(np.zeros(int(seconds * self.sample_rate), dtype=np.float32), self.sample_rate, "gap")
+
+    def wait(self, clip):
+        """Blocks until 'clip' has been handed to the device and its buffer has drained."""
+        clip.done.wait()
+        # The device still holds one buffer of audio when the callback returns
+        time.sleep(self._stream.latency)
+
+    def take_stats(self):
+        """
+        Returns (clip_count, audio_seconds, overhead_seconds) for the clips queued
+        since the last call, where overhead is wall time beyond the audio itself.
+        """
+        with self._lock:
+            clips = [c for c in self._finished if c.done.is_set()]
+            self._finished = [c for c in self._finished if not c.done.is_set()]
+        if not clips:
+            return 0, 0.0, 0.0
+        audio = sum(len(c.samples) for c in clips) / self.sample_rate
+        wall = max(c.finished_at for c in clips) - min(c.queued_at for c in clips)
+        return sum(1 for c in clips if c.label != "gap"), audio, max(0.0, wall - audio)
+
+    def close(self):
+        self._stream.stop()
+        self._stream.close()
+
+
+# --- CAPTURE ENGINE ---
+class CaptureEngine:
+    """
+    Keeps one input stream open for the whole session. Its callback resamples
+    each block to 16 kHz and writes it into a pre-allocated float32 ring
+    buffer, so a recording costs no stream open and no per-block allocation.
+    Positions are absolute sample counts ('written' only grows); a recording
+    starts 'preroll_seconds' before mark() so a syllable spoken right after
+    the prompt is never clipped.
+    Every block also writes a byte to a wake pipe, so a capture loop can sleep
+    in one select() on stdin + the pipe instead of polling. The callback never
+    prints: input overflows and dropped frames (gaps in the ADC timestamps)
+    are counted for per-recording reports (stats(), print_capture_health),
+    and adapt_block_size() reacts to them: the new block size is applied by
+    apply_block_size() before the next recording, not while the last one is
+    handed to transcription.
+    """
+    def __init__(self, ring_seconds=CAPTURE_RING_SECONDS, preroll_seconds=CAPTURE_PREROLL_SECONDS,
+                 blocksize=CAPTURE_BLOCK_SIZE, min_blocksize=CAPTURE_MIN_BLOCK_SIZE,
+                 max_blocksize=CAPTURE_MAX_BLOCK_SIZE, shrink_after=CAPTURE_SHRINK_AFTER,
+                 fallback_rate=FALLBACK_SAMPLE_RATE):
+        self.device_rate = choose_capture_rate(fallback_rate)
+        self.resampler = None
+        if self.device_rate != WHISPER_SAMPLE_RATE:
+            self.resampler = StreamingResampler(self.device_rate, WHISPER_SAMPLE_RATE)
+        self.ring_seconds = ring_seconds
+        self.ring = np.zeros(int(ring_seconds * WHISPER_SAMPLE_RATE), dtype=np.float32)
+        self.preroll = int(preroll_seconds * WHISPER_SAMPLE_RATE)
+        self.written = 0
+        self.resample_cpu = 0.0
+        self.ring_overruns = 0 # Reads that fell a whole ring behind
+        self.overflows = 0     # Callbacks flagged input_overflow by PortAudio
+        self.dropped_frames = 0
+        self.callback_cpu = 0.0
+        self.blocksize = blocksize
+        self.min_blocksize = min_blocksize
+        self.max_blocksize = max_blocksize
+        self.shrink_after = shrink_after
+        self._clean_recordings = 0
+        self._pending_blocksize = None
+        self._last_adc = None
+        self._last_frames = 0
+        self._cond = threading.Condition()
+        self.wake_fd, self._wake_w = os.pipe()
+        os.set_blocking(self.wake_fd, False)
+        os.set_blocking(self._wake_w, False)
+        self._open_stream()
+
+    def _open_stream(self):
+        import sounddevice as sd
+
+        self._last_adc = None
+        self.stream = sd.InputStream(samplerate=self.device_rate,
+                                     channels=1, # CRITICAL FIX: Set to 1 channel (mono)
+                                     dtype='float32',
+                                     blocksize=self.blocksize,
+                                     callback=self._callback)
+        self.stream.start()
+
+    def _callback(self, indata, frames, time_info, status):
+        callback_start = time.thread_time()
+        if status.input_overflow:
+            self.overflows += 1
+        # A jump in the ADC clock larger than the last block means frames were lost
+        adc_time = time_info.inputBufferAdcTime
+        if adc_time and self._last_adc is not None:
+            gap = int(round((adc_time - self._last_adc) * self.device_rate)) - self._last_frames
+            if gap > self._last_frames // 2:
+                self.dropped_frames += gap
+        if adc_time:
+            self._last_adc, self._last_frames = adc_time, frames
+
+        block = indata[:, 0]
+        if self.resampler is not None:
+            cpu_start = time.thread_time()
+            block = self.resampler.process(block)
+            self.resample_cpu += time.thread_time() - cpu_start
+        size = len(self.ring)
+        n = len(block)
+        pos = self.written % size
+        first = min(n, size - pos)
+        self.ring[pos:pos + first] = block[:first]
+        self.ring[:n - first] = block[first:]
+        with self._cond:
+            self.written += n
+            self._cond.notify_all()
+        try:
+            os.write(self._wake_w, b"\0")
+        except BlockingIOError:
+            pass # Pipe full: the reader is already due to wake up
+        self.callback_cpu += time.thread_time() - callback_start
+
+    def drain_wake(self):
+        """Empties the wake pipe after select() reported it readable."""
+        try:
+            while os.read(self.wake_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def stats(self):
+        """Counters for per-recording deltas (see print_capture_health)."""
+        return {"overflows": self.overflows, "dropped_frames": self.dropped_frames,
+                "callback_cpu": self.callback_cpu, "resample_cpu": self.resample_cpu,
+                "ring_overruns": self.ring_overruns}
+
+    def adapt_block_size(self, overflows):
+        """
+        Doubles the block size after a recording with overflows, or halves it
+        after 'shrink_after' clean recordings. Only decides: the stream is
+        reopened by the next apply_block_size() call.
+        """
+        new_size = self.blocksize
+        if overflows:
+            self._clean_recordings = 0
+            new_size = min(self.max_blocksize, self.blocksize * 2)
+        else:
+            self._clean_recordings += 1
+            if self._clean_recordings >= self.shrink_after:
+                self._clean_recordings = 0
+                new_size = max(self.min_blocksize, self.blocksize // 2)
+        self._pending_blocksize = new_size if new_size != self.blocksize else None
+
+    def apply_block_size(self):
+        """
+        Reopens the stream with the block size chosen by adapt_block_size(),
+        if it changed. Called before the next recording's prompt, so the
+        reopen never delays handing the last recording to transcription.
+        """
+        new_size, self._pending_blocksize = self._pending_blocksize, None
+        if new_size is None:
+            return
+        logging.info(f"Capture block size {self.blocksize} -> {new_size}")
+        self.stream.stop()
+        self.stream.close()
+        self.blocksize = new_size
+        self._open_stream()
+
+    def mark(self):
+        """Start position for a new recording, including the pre-roll."""
+        with self._cond:
+            return max(0, self.written - self.preroll)
+
+    def position(self):
+        """Current end of the captured audio (for push-to-talk stops)."""
+        with self._cond:
+            return self.written
+
+    def read(self, cursor, timeout=0.5):
+        """
+        Waits until audio past 'cursor' arrives and returns (block, new cursor),
+        or (None, cursor) on timeout. The block is a view into the ring when it
+        does not wrap; it stays valid for about 'ring_seconds'.
+        """
+        with self._cond:
+            if self.written <= cursor and not self._cond.wait_for(lambda: self.written > cursor, timeout):
+                return None, cursor
+            end = self.written
+        if end - cursor > len(self.ring):
+            self.ring_overruns += 1
+            cursor = end - len(self.ring)
+        start, stop = cursor % len(self.ring), end % len(self.ring)
+        if start < stop:
+            return self.ring[start:stop], end
+        return np.concatenate((self.ring[start:], self.ring[:stop])), end
+
+    def extract(self, start, end):
+        """Copies samples [start, end) out of the ring (the recording's one allocation)."""
+        if end - start > len(self.ring):
+            print(f"⚠️ Recording longer than {self.ring_seconds:.0f}s; keeping the end.")
+            start = end - len(self.ring)
+        out = np.empty(end - start, dtype=np.float32)
+        a, b = start % len(self.ring), end % len(self.ring)
+        if a < b or end == start:
+            out[:] = self.ring[a:a + len(out)]
+        else:
+            out[:len(self.ring) - a] = self.ring[a:]
+            out[len(self.ring) - a:] = self.ring[:b]
+        return out
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+        os.close(self.wake_fd)
+        os.close(self._wake_w)
+
+
+def print_capture_health(before, after, wall_seconds, loop_cpu, process_cpu, blocksize):
+    """
+    Reports CPU use and lost audio for one recording (deltas of CaptureEngine.stats()):
+    the capture loop's own CPU, the audio callback's, and the whole process's
+    (which includes any streaming decode running meanwhile).
+    """
+    delta = {key: after[key] - before[key] for key in after}
+    wall_seconds = max(wall_seconds, 1e-6)
+    loop_share = 100 * loop_cpu / wall_seconds
+    process_share = 100 * process_cpu / wall_seconds
+    callback_ms = 1000 * delta["callback_cpu"] / wall_seconds
+    print(f"🧮 Capture health: loop {loop_share:.1f}% of a core, callback {callback_ms:.1f} ms/s, "
+          f"process {process_share:.0f}% | "
+          f"{delta['overflows']} overruns, {delta['dropped_frames']} frames dropped | block {blocksize}")
+    return delta
@@ -0,0 +1,208 @@
+import os
+import csv
+import sys
+import json
+import time
+import wave
+import socket
+import argparse
+import resource
+import platform
+import tempfile
+import subprocess
+import contextlib
+import numpy as np
+import tutor_stt
+import tutor_audio
+
+# --- OFFLINE BENCHMARK ---
+# Replays a directory of recordings through language_tutor_rpi.transcribe_audio()
+# (no microphone) for every model size x STT backend, and writes one JSON
+# report: RTF distribution, word accuracy (score_comparison) and peak RSS per
+# configuration. Each configuration runs in its own process, so peak RSS is
+# that model's alone.
+#
+#   python tutor_benchmark.py recordings/ --models tiny base small --backends whisper faster-whisper -o bench.json
+#
+# Pairing recordings with tutor_content.csv rows:
+#   - a manifest.csv in the directory with "file" and "text" columns, or
+#   - file names starting with the row's 1-based number: 007.wav, 7_pierre.wav, ...
+
+MANIFEST_FILE = "manifest.csv"
+DEFAULT_MODELS = ("tiny", "base", "small")
+DEFAULT_BACKENDS = ("whisper",)
+WHISPER_SAMPLE_RATE = tutor_audio.WHISPER_SAMPLE_RATE
+RSS_UNITS_PER_MB = 1024 * 1024 if sys.platform == "darwin" else 1024 # ru_maxrss: bytes on macOS, KiB on Linux
+
+
+def pair_corpus(corpus_dir, content_file):
+    """Returns [(wav path, deck row)] for the recordings in 'corpus_dir'."""
+    with open(content_file, mode='r', encoding='utf-8') as file:
+        rows = list(csv.DictReader(file))
+    by_text = {row['text'].strip(): row for row in rows}
+
+    pairs = []
+    manifest = os.path.join(corpus_dir, MANIFEST_FILE)
+    if os.path.exists(manifest):
+        with open(manifest, mode='r', encoding='utf-8') as file:
+            for entry in csv.DictReader(file):
+                row = by_text.get(entry['text'].strip(), {"text": entry['text'].strip()})
+                pairs.append((os.path.join(corpus_dir, entry['file']), row))
+        return pairs
+
+    for name in sorted(os.listdir(corpus_dir)):
+        if not name.lower().endswith(".wav"):
+            continue
+        digits = name[:len(name) - len(name.lstrip("0123456789"))]
+        if not digits or not 1 <= int(digits) <= len(rows):
+            print(f"⚠️ Skipping {name}: no deck row number prefix and no {MANIFEST_FILE}")
+            continue
+        pairs.append((os.path.join(corpus_dir, name), rows[int(digits) - 1]))
+    return pairs
+
+
+def load_recording(path):
+    """Reads a 16-bit WAV as float32 16 kHz mono (resampled if needed)."""
+    with wave.open(path, "rb") as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"Expected 16-bit PCM: {path}")
+        rate = wf.getframerate()
+        frames = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        audio = frames.reshape(-1, wf.getnchannels()).mean(axis=1).astype(np.float32) / 32768.0
+    return tutor_audio.resample(audio, rate, WHISPER_SAMPLE_RATE)
+
+
+def distribution(values):
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return None
+    return {"mean": float(values.mean()), "p50": float(np.percentile(values, 50)),
+            "p90": float(np.percentile(values, 90)), "p95": float(np.percentile(values, 95)),
+            "max": float(values.max())}
+
+
+def run_config(args):
+    """Worker: benchmarks one model/backend in this process and writes its JSON result."""
+    import language_tutor_rpi as tutor # Imports no audio I/O or Piper: runs headless
+
+    tutor.SHORT_AUDIO_MODE = args.short_audio
+    tutor.DECODE_PROFILE = args.decode_profile
+    tutor.DECK_CONSTRAINED = args.deck_constrained
+    with open(args.content, mode='r', encoding='utf-8') as file:
+        tutor.TUTOR_CONTENT = list(csv.DictReader(file))
+    pairs = pair_corpus(args.corpus, args.content)
+
+    start = time.perf_counter()
+    model = tutor_stt.load_backend(args.backend, args.model)
+    load_seconds = time.perf_counter() - start
+    rss_after_load = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    items = []
+    quiet = open(os.devnull, "w")
+    for index, (path, row) in enumerate(pairs[:args.warmup] + pairs):
+        audio = load_recording(path)
+        duration = len(audio) / WHISPER_SAMPLE_RATE
+        with contextlib.redirect_stdout(sys.stderr if args.verbose else quiet):
+            heard, transcribe_time, rtf = tutor.transcribe_audio(audio, model, tutor.LANGUAGE, row['text'], duration)
+            accuracy, _ = tutor.score_comparison(row['text'], heard)
+        if index < args.warmup:
+            continue # Warm-up pass: first-call costs (allocation, kernel selection) not scored
+        items.append({"file": os.path.basename(path), "text": row['text'], "heard": heard.strip(),
+                      "duration": duration, "transcribe_time": transcribe_time, "rtf": rtf,
+                      "accuracy": accuracy})
+
+    result = {
+        "model": args.model, "backend": args.backend,
+        "options": {"short_audio": args.short_audio, "decode_profile": args.decode_profile,
+                    "deck_constrained": args.deck_constrained},
+        "load_seconds": load_seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / RSS_UNITS_PER_MB,
+        "rss_after_load_mb": rss_after_load / RSS_UNITS_PER_MB,
+        "recordings": len(items),
+        "rtf": distribution([item["rtf"] for item in items]),
+        "accuracy_mean": float(np.mean([item["accuracy"] for item in items])) if items else None,
+        "perfect_rate": float(np.mean([item["accuracy"] >= 1.0 for item in items])) if items else None,
+        "items": items,
+    }
+    with open(args.worker_output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(args):
+    """Runs every model x backend in a subprocess and collects the report."""
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "revision": git_revision(),
+        "host": socket.gethostname(), "machine": platform.machine(), "python": platform.python_version(),
+        "corpus": os.path.abspath(args.corpus), "configs": [], "failures": [],
+    }
+    for backend in args.backends:
+        for model_name in args.models:
+            print(f"▶️ {backend} / {model_name} ...", flush=True)
+            with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+                worker_output = tmp.name
+            command = [sys.executable, os.path.abspath(__file__), args.corpus, "--worker",
+                       "--model", model_name, "--backend", backend, "--content", args.content,
+                       "--warmup", str(args.warmup), "--worker-output", worker_output]
+            if args.short_audio:
+                command.append("--short-audio")
+            if args.decode_profile:
+                command += ["--decode-profile", args.decode_profile]
+            if args.deck_constrained:
+                command.append("--deck-constrained")
+            if args.verbose:
+                command.append("--verbose")
+            process = subprocess.run(command, stderr=None if args.verbose else subprocess.PIPE, text=True)
+            if process.returncode != 0:
+                error = (process.stderr or "").strip().splitlines()[-1:] or [f"exit code {process.returncode}"]
+                print(f"   FAILED: {error[0]}")
+                report["failures"].append({"model": model_name, "backend": backend, "error": error[0]})
+                os.remove(worker_output)
+                continue
+            with open(worker_output, encoding="utf-8") as f:
+                config = json.load(f)
+            os.remove(worker_output)
+            report["configs"].append(config)
+            rtf = config["rtf"] or {}
+            print(f"   RTF p50 {rtf.get('p50', float('nan')):.2f} p95 {rtf.get('p95', float('nan')):.2f} | "
+                  f"accuracy {config['accuracy_mean'] or 0:.0%} | peak RSS {config['peak_rss_mb']:.0f} MB")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a WAV corpus through transcribe_audio() per model and backend")
+    parser.add_argument("corpus", help="directory of recordings (see the pairing rules at the top of this file)")
+    parser.add_argument("--content", default="tutor_content.csv", help="deck CSV the recordings belong to")
+    parser.add_argument("--models", nargs="+", default=list(DEFAULT_MODELS), help="model sizes to compare")
+    parser.add_argument("--backends", nargs="+", default=list(DEFAULT_BACKENDS), help="STT backends to compare")
+    parser.add_argument("--warmup", type=int, default=1, help="unscored warm-up transcriptions per config")
+    parser.add_argument("--short-audio", action="store_true", help="benchmark with the tutor's --short-audio")
+    parser.add_argument("--decode-profile", help="benchmark with the tutor's --decode-profile")
+    parser.add_argument("--deck-constrained", action="store_true", help="benchmark with --deck-constrained")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="JSON report to write")
+    parser.add_argument("--verbose", action="store_true", help="show the tutor's own output")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--model", help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_config(args)
+        sys.exit(0)
+
+    if not os.path.isdir(args.corpus):
+        print(f"FATAL: Corpus directory not found: {args.corpus}")
+        sys.exit(1)
+    report = run_benchmark(args)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ Wrote {len(report['configs'])} configurations to {args.output}")
+    sys.exit(1 if report["failures"] else 0)
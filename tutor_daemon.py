@@ -0,0 +1,230 @@
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+import threading
+import socketserver
+import warnings
+import queue
+from concurrent.futures import Future
+import numpy as np
+
+import tutor_stt
+import tutor_decoding
+
+# --- CONFIGURATION ---
+MODEL_NAME = "small"
+STT_BACKEND = os.environ.get("TUTOR_STT_BACKEND", "whisper")
+SOCKET_PATH = tutor_stt.DAEMON_SOCKET
+BATCH_SIZE = 1          # >1 enables dynamic batching of concurrent requests (multi-learner)
+BATCH_WAIT_MS = 50      # How long the first request of a batch waits for company
+
+# The resident model; one decode at a time (Whisper's kv-cache hooks are per model)
+MODEL = None
+MODEL_LOCK = threading.Lock()
+BATCHER = None
+
+
+class PendingRequest:
+    """One queued transcription request and the Future its handler waits on."""
+    def __init__(self, audio, language, initial_prompt):
+        self.audio = audio
+        self.language = language
+        self.initial_prompt = initial_prompt
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class TranscriptionBatcher:
+    """
+    Collects requests arriving from several learners within BATCH_WAIT_MS (up to
+    BATCH_SIZE) and runs them together: one Whisper encoder pass over the stacked
+    mel spectrograms, then one batched greedy decode in which every request
+    keeps its own language and prompt (tutor_decoding.decode_batch).
+    Backends without a batch API fall back to one transcribe() per request, as
+    do requests without a language (they need language detection).
+    Batched decoding is a single greedy 30 s window (no temperature fallback),
+    which covers tutor phrases.
+    """
+    def __init__(self, batch_size, wait_seconds):
+        self.batch_size = batch_size
+        self.wait_seconds = wait_seconds
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, audio, language, initial_prompt):
+        request = PendingRequest(audio, language, initial_prompt)
+        self._queue.put(request)
+        return request
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.wait_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            queue_times = [started - request.enqueued_at for request in batch]
+            try:
+                with MODEL_LOCK:
+                    if isinstance(MODEL, tutor_stt.WhisperBackend):
+                        texts = self._whisper_batch(batch)
+                    else:
+                        texts = [MODEL.transcribe(r.audio, language=r.language,
+                                                  initial_prompt=r.initial_prompt)["text"] for r in batch]
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            compute_time = time.perf_counter() - started
+            for request, text, queue_time in zip(batch, texts, queue_times):
+                request.future.set_result((text, queue_time, compute_time))
+            logging.info(f"Batch of {len(batch)}: queue wait max {max(queue_times) * 1000:.0f} ms, "
+                         f"mean {sum(queue_times) / len(batch) * 1000:.0f} ms, compute {compute_time:.2f}s")
+
+    def _whisper_batch(self, batch):
+        import torch
+        import whisper
+
+        model = MODEL.model
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(r.audio.copy())),
+                                        n_mels=model.dims.n_mels)
+            for r in batch
+        ]).to(model.device)
+        with torch.no_grad():
+            audio_features = model.embed_audio(mel) # One encoder pass for the whole batch
+
+        texts = [None] * len(batch)
+        rows = [i for i, request in enumerate(batch) if request.language]
+        for i, request in enumerate(batch):
+            if not request.language:
+                texts[i] = MODEL.transcribe(request.audio, initial_prompt=request.initial_prompt)["text"]
+        if rows:
+            tokenizers, prompts = [], []
+            for i in rows:
+                tokenizer = tutor_decoding.get_tokenizer(model, batch[i].language)
+                prompt = batch[i].initial_prompt
+                tokenizers.append(tokenizer)
+                prompts.append(tokenizer.encode(" " + prompt.strip()) if prompt else None)
+            with torch.no_grad():
+                # One decoder pass per step for every row, each with its own prompt
+                tokens = tutor_decoding.decode_batch(model, audio_features[rows], tokenizers, prompts)
+            for i, row_tokens in zip(rows, tokens):
+                texts[i] = tokenizers[0].decode(row_tokens).strip()
+        logging.info(f"Batch decode: {len(rows)} rows in one pass, {len(batch) - len(rows)} without a language")
+        return texts
+
+
+class TranscriptionHandler(socketserver.BaseRequestHandler):
+    """Serves framed requests from one tutor client until it disconnects."""
+
+    def handle(self):
+        while True:
+            try:
+                header, payload = tutor_stt.recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                response = self.dispatch(header, payload)
+            except Exception as e:
+                logging.exception("Request failed")
+                response = {"ok": False, "error": str(e)}
+            try:
+                tutor_stt.send_message(self.request, response)
+            except OSError:
+                return
+
+    def dispatch(self, header, payload):
+        op = header.get("op")
+        if op == "ping":
+            return {"ok": True, "backend": STT_BACKEND, "model": MODEL_NAME}
+        if op == "transcribe":
+            audio = np.frombuffer(payload, dtype=np.float32)
+            start_time = time.time()
+            queue_time = 0.0
+            if BATCHER is not None:
+                request = BATCHER.submit(audio, header.get("language"), header.get("initial_prompt"))
+                text, queue_time, _ = request.future.result()
+            else:
+                with MODEL_LOCK:
+                    result = MODEL.transcribe(audio,
+                                              language=header.get("language"),
+                                              initial_prompt=header.get("initial_prompt"),
+                                              **header.get("options", {}))
+                text = result["text"]
+            transcribe_time = time.time() - start_time
+            audio_duration = len(audio) / tutor_stt.SAMPLE_RATE
+            rtf = transcribe_time / audio_duration if audio_duration > 0 else float('inf')
+            logging.info(f"Transcribed {audio_duration:.2f}s in {transcribe_time:.2f}s (RTF: {rtf:.2f}, "
+                         f"queued {queue_time * 1000:.0f} ms)")
+            return {"ok": True, "text": text, "transcribe_time": transcribe_time, "queue_time": queue_time}
+        raise ValueError(f"Unknown op: {op}")
+
+
+class TranscriptionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def main():
+    """Loads the STT model once and serves it on a Unix socket until stopped."""
+    global MODEL, MODEL_NAME, STT_BACKEND, SOCKET_PATH, BATCHER
+
+    parser = argparse.ArgumentParser(description="Shared local transcription daemon for the language tutor")
+    parser.add_argument("--backend", default=STT_BACKEND, help="STT backend (see tutor_stt.STT_BACKENDS)")
+    parser.add_argument("--model", default=MODEL_NAME, help="model size, e.g. tiny, base, small")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Unix socket path")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="max concurrent requests transcribed as one batch (1 = no batching)")
+    parser.add_argument("--batch-wait-ms", type=float, default=BATCH_WAIT_MS,
+                        help="how long to wait for more requests before running a batch")
+    args = parser.parse_args()
+    MODEL_NAME, STT_BACKEND, SOCKET_PATH = args.model, args.backend, args.socket
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    warnings.filterwarnings("ignore", category=UserWarning)
+
+    print(f"Loading Whisper model: {MODEL_NAME} ({STT_BACKEND} backend)...")
+    start_time = time.time()
+    try:
+        MODEL = tutor_stt.load_backend(STT_BACKEND, MODEL_NAME)
+    except Exception as e:
+        print(f"FATAL: Could not load Whisper model. Error: {e}")
+        sys.exit(1)
+    print(f"✅ Model loaded in {time.time() - start_time:.1f} seconds")
+    if args.batch_size > 1:
+        BATCHER = TranscriptionBatcher(args.batch_size, args.batch_wait_ms / 1000)
+        print(f"Batching up to {args.batch_size} requests within {args.batch_wait_ms:.0f} ms")
+
+    # A socket left behind by a crashed daemon would make bind() fail
+    if os.path.exists(SOCKET_PATH):
+        os.remove(SOCKET_PATH)
+    server = TranscriptionServer(SOCKET_PATH, TranscriptionHandler)
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+
+    print(f"🎧 Serving transcriptions on {SOCKET_PATH} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(SOCKET_PATH):
+            os.remove(SOCKET_PATH)
+        print("--- STT daemon stopped ---")
+
+
+if __name__ == "__main__":
+    main()
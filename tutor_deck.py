@@ -0,0 +1,222 @@
+import os
+import re
+import csv
+import mmap
+import json
+import struct
+import hashlib
+import argparse
+import subprocess
+import numpy as np
+
+# --- COMPILED DECK ---
+# tutor_deck.py turns tutor_content.csv into one binary artifact that the tutor
+# memory-maps at startup. Everything the tutor used to recompute each round is
+# stored per row: the normalized words compared against the transcription, the
+# Whisper prompt token ids and the espeak-ng phonemes.
+#
+#   python tutor_deck.py tutor_content.csv -o tutor_content.deck
+#
+# File layout (little-endian):
+#   header   "<4sHHII": magic, version, field count, row count, metadata length
+#   metadata JSON (source CSV hash, tokenizer, espeak voice), padded to 4 bytes
+#   index    uint32[rows][fields][2]: (offset into the data area, byte length)
+#   data     UTF-8 strings, "\x1f"-joined word lists, uint32 token arrays
+
+DECK_MAGIC = b"TDCK"
+DECK_VERSION = 1
+HEADER = struct.Struct("<4sHHII")
+FIELDS = ("text", "source", "translation", "notes", "words", "prompt_tokens", "phonemes")
+TEXT_FIELDS = ("text", "source", "translation", "notes", "phonemes")
+WORD_SEPARATOR = "\x1f"
+ESPEAK_VOICE = "fr"
+WHISPER_LANGUAGE = "fr"
+
+
+def normalize_words(text):
+    """The tutor's comparison normalization: punctuation removed, lowercased, split into words."""
+    return re.sub(r'[^\w\s]', '', text).lower().split()
+
+
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def whisper_prompt_tokens(texts, language=WHISPER_LANGUAGE):
+    """
+    Token ids of each text as Whisper encodes an initial prompt (" " + text),
+    with the multilingual tokenizer. Returns (token lists, tokenizer name), or
+    empty lists when openai-whisper is not installed.
+    """
+    try:
+        from whisper.tokenizer import get_tokenizer
+    except ImportError:
+        print("⚠️ openai-whisper not installed; prompt tokens left empty.")
+        return [[] for _ in texts], None
+    tokenizer = get_tokenizer(True, language=language, task="transcribe")
+    return [tokenizer.encode(" " + text.strip()) for text in texts], tokenizer.encoding.name
+
+
+def espeak_phonemes(texts, voice=ESPEAK_VOICE):
+    """IPA phonemes of each text from espeak-ng, or empty strings if it is not installed."""
+    phonemes = []
+    for text in texts:
+        try:
+            result = subprocess.run(["espeak-ng", "-q", "--ipa", "-v", voice, text],
+                                    capture_output=True, text=True, check=True)
+        except FileNotFoundError:
+            print("⚠️ espeak-ng not installed; phonemes left empty.")
+            return ["" for _ in texts]
+        except subprocess.CalledProcessError as e:
+            print(f"⚠️ espeak-ng failed for '{text}': {e.stderr.strip()}")
+            phonemes.append("")
+            continue
+        phonemes.append(" ".join(result.stdout.split()))
+    return phonemes
+
+
+def encode_field(name, value):
+    if name == "words":
+        return WORD_SEPARATOR.join(value).encode("utf-8")
+    if name == "prompt_tokens":
+        return np.asarray(value, dtype="<u4").tobytes()
+    return (value or "").encode("utf-8")
+
+
+def compile_deck(csv_path, out_path, voice=ESPEAK_VOICE):
+    """Compiles the deck CSV at 'csv_path' into the binary artifact 'out_path'. Returns the row count."""
+    with open(csv_path, mode='r', encoding='utf-8') as file:
+        rows = list(csv.DictReader(file))
+    texts = [row['text'] for row in rows]
+    prompt_tokens, tokenizer_name = whisper_prompt_tokens(texts)
+    phonemes = espeak_phonemes(texts, voice)
+
+    meta = json.dumps({
+        "source_sha256": file_sha256(csv_path),
+        "tokenizer": tokenizer_name,
+        "espeak_voice": voice,
+    }).encode("utf-8")
+    meta += b" " * (-len(meta) % 4)
+
+    index = np.zeros((len(rows), len(FIELDS), 2), dtype="<u4")
+    data = bytearray()
+    for i, row in enumerate(rows):
+        values = dict(row, words=normalize_words(row['text']),
+                      prompt_tokens=prompt_tokens[i], phonemes=phonemes[i])
+        for j, name in enumerate(FIELDS):
+            encoded = encode_field(name, values[name])
+            index[i, j] = (len(data), len(encoded))
+            data += encoded + b"\0" * (-len(encoded) % 4) # Keep token arrays aligned
+
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(DECK_MAGIC, DECK_VERSION, len(FIELDS), len(rows), len(meta)))
+        f.write(meta)
+        f.write(index.tobytes())
+        f.write(data)
+    os.replace(tmp_path, out_path)
+    return len(rows)
+
+
+class DeckRow:
+    """
+    One row of a CompiledDeck, read from the mapping on access. Indexes like
+    the CSV rows' dicts (row['text'], row.get('notes')), plus the compiled
+    fields 'words' (list), 'prompt_tokens' (uint32 array) and 'phonemes'.
+    """
+    __slots__ = ("deck", "index")
+
+    def __init__(self, deck, index):
+        self.deck = deck
+        self.index = index
+
+    def __getitem__(self, name):
+        return self.deck.field(self.index, name)
+
+    def get(self, name, default=None):
+        if name not in FIELDS:
+            return default
+        value = self.deck.field(self.index, name)
+        return value if len(value) else default
+
+    def keys(self):
+        return FIELDS
+
+    def __repr__(self):
+        return f"DeckRow({self.index}, {self['text']!r})"
+
+
+class CompiledDeck:
+    """Read-only, memory-mapped view of a compiled deck; a sequence of DeckRow."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_fields, self.rows, meta_len = HEADER.unpack_from(self._map, 0)
+        if magic != DECK_MAGIC or version != DECK_VERSION or n_fields != len(FIELDS):
+            self._map.close()
+            raise ValueError(f"Not a version {DECK_VERSION} compiled deck: {path}")
+        self.meta = json.loads(bytes(self._map[HEADER.size:HEADER.size + meta_len]))
+        index_start = HEADER.size + meta_len
+        self._index = np.frombuffer(self._map, dtype="<u4", count=self.rows * n_fields * 2,
+                                    offset=index_start).reshape(self.rows, n_fields, 2)
+        self._data_start = index_start + self._index.nbytes
+        self._field_ids = {name: j for j, name in enumerate(FIELDS)}
+
+    def field(self, i, name):
+        offset, length = self._index[i, self._field_ids[name]]
+        start = self._data_start + int(offset)
+        if name == "prompt_tokens":
+            return np.frombuffer(self._map, dtype="<u4", count=int(length) // 4, offset=start)
+        value = self._map[start:start + int(length)].decode("utf-8")
+        if name == "words":
+            return value.split(WORD_SEPARATOR) if value else []
+        return value
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.rows
+        if not 0 <= i < self.rows:
+            raise IndexError("deck row out of range")
+        return DeckRow(self, i)
+
+    def __iter__(self):
+        return (DeckRow(self, i) for i in range(self.rows))
+
+    def is_stale(self, csv_path):
+        """True if 'csv_path' changed since the deck was compiled from it."""
+        return os.path.exists(csv_path) and file_sha256(csv_path) != self.meta.get("source_sha256")
+
+
+def load_deck(csv_path, deck_path):
+    """
+    Returns the CompiledDeck at 'deck_path' if it exists and was compiled from
+    the current 'csv_path', else None (the caller falls back to the CSV).
+    """
+    if not os.path.exists(deck_path):
+        return None
+    try:
+        deck = CompiledDeck(deck_path)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring compiled deck {deck_path}: {e}")
+        return None
+    if deck.is_stale(csv_path):
+        print(f"⚠️ {deck_path} is older than {csv_path}; recompile it with tutor_deck.py.")
+        return None
+    return deck
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile a tutor deck CSV into a memory-mappable artifact")
+    parser.add_argument("csv", nargs="?", default="tutor_content.csv", help="deck CSV (text, source, translation, notes)")
+    parser.add_argument("-o", "--output", help="output file (default: the CSV name with a .deck extension)")
+    parser.add_argument("--voice", default=ESPEAK_VOICE, help="espeak-ng voice for the phonemes")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.csv)[0] + ".deck"
+    count = compile_deck(args.csv, output, args.voice)
+    print(f"✅ Compiled {count} phrases from {args.csv} into {output} ({os.path.getsize(output)} bytes)")
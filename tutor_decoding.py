@@ -0,0 +1,514 @@
+import csv
+import math
+import json
+import time
+import argparse
+import warnings
+import numpy as np
+import tutor_audio
+from tutor_deck import normalize_words # The round verdict's normalization
+
+# --- WHISPER DECODING MODES ---
+# Decoding paths that reach into openai-whisper's encoder/decoder directly,
+# instead of going through model.transcribe(). They need the "whisper" STT
+# backend (tutor_stt.WhisperBackend) or a bare whisper model.
+
+# Forced-alignment verdict thresholds
+FORCED_PASS_MEAN_LOGPROB = -1.0 # Mean log-probability of the expected tokens
+FORCED_PASS_WORD_PROB = 0.2     # Every word's (geometric mean) probability must reach this
+SAMPLE_RATE = 16000
+
+# Short-utterance mode: encode only the real duration instead of a 30 s window
+HOP_LENGTH = 160                # whisper.audio.HOP_LENGTH (10 ms mel frames)
+SHORT_AUDIO_PAD_SECONDS = 0.5   # Trailing silence kept after the speech
+SHORT_AUDIO_MAX_SECONDS = 10.0  # Longer clips use the regular 30 s path
+MAX_DECODE_TOKENS = 64          # Token cap for the greedy decoder (tutor phrases are short)
+
+
+# --- DECODE BUDGETS ---
+class DecodeProfile:
+    """
+    How much decoding a round may spend, relative to the expected phrase:
+    - budget_ratio/budget_slack: token cap = ratio * expected tokens + slack
+      (None = MAX_DECODE_TOKENS)
+    - early_exit: accept a hypothesis that matches the expected words and is
+      ended there by the decoder (<|endoftext|> next), skipping the fallback
+    - diverge_words: stop once this many finished words are not in the phrase
+    - temperatures: the fallback schedule; each retry re-runs only the decoder
+      (the audio features are kept), and only while the average log-probability
+      stays under logprob_threshold
+    """
+    def __init__(self, name, budget_ratio=None, budget_slack=4, early_exit=False,
+                 diverge_words=None, temperatures=(0.0,), logprob_threshold=-1.0):
+        self.name = name
+        self.budget_ratio = budget_ratio
+        self.budget_slack = budget_slack
+        self.early_exit = early_exit
+        self.diverge_words = diverge_words
+        self.temperatures = tuple(temperatures)
+        self.logprob_threshold = logprob_threshold
+
+    def token_budget(self, expected_tokens):
+        if self.budget_ratio is None:
+            return MAX_DECODE_TOKENS
+        return min(MAX_DECODE_TOKENS, math.ceil(self.budget_ratio * expected_tokens) + self.budget_slack)
+
+
+DECODE_PROFILES = {
+    # Whisper-like: no budget beyond the global cap, full temperature fallback
+    "open": DecodeProfile("open", temperatures=(0.0, 0.2, 0.4, 0.6, 0.8, 1.0)),
+    # Capped at 1.5x the phrase, accepts a match, one warmer retry
+    "bounded": DecodeProfile("bounded", budget_ratio=1.5, budget_slack=4, early_exit=True,
+                             temperatures=(0.0, 0.4)),
+    # Tight cap, accepts a match, stops on a clear divergence, no fallback
+    "strict": DecodeProfile("strict", budget_ratio=1.2, budget_slack=2, early_exit=True,
+                            diverge_words=2, temperatures=(0.0,)),
+}
+
+
+class DecodeResult:
+    """Result of decode_with_budget(): the text plus what it cost to get it."""
+    def __init__(self, text, steps, retries, stop_reason, avg_logprob, temperature):
+        self.text = text
+        self.steps = steps             # Decoder forward passes, over all attempts
+        self.retries = retries         # Temperature-fallback retries used
+        self.stop_reason = stop_reason # "eot", "match", "diverged" or "budget"
+        self.avg_logprob = avg_logprob
+        self.temperature = temperature # Temperature of the attempt that was kept
+
+
+# --- DECK-CONSTRAINED DECODING ---
+class DeckTrie:
+    """
+    Token trie over every deck phrase. Each phrase is tokenized the way the
+    decoder emits it (leading space) and ends in <|endoftext|>, so the
+    children of a node are exactly the tokens that keep the hypothesis inside
+    the deck. A trailing "." / "!" / "?" is optional.
+    """
+    def __init__(self, tokenizer, texts):
+        self.eot = tokenizer.eot
+        self.root = {}
+        self.phrases = 0
+        for text in texts:
+            text = text.strip()
+            variants = {text, text.rstrip(".!?").rstrip()}
+            for variant in variants:
+                if variant:
+                    self.insert(tokenizer.encode(" " + variant) + [self.eot])
+            self.phrases += 1
+
+    def insert(self, tokens):
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+
+    def allowed(self, tokens):
+        """Token ids allowed after 'tokens', or None if 'tokens' left the trie."""
+        node = self.root
+        for token in tokens:
+            node = node.get(token)
+            if node is None:
+                return None
+        return list(node)
+
+
+def build_deck_trie(model, texts, language="French"):
+    """Builds a DeckTrie for 'texts' (the deck's `text` column) with the model's tokenizer."""
+    return DeckTrie(get_tokenizer(unwrap_whisper_model(model), language), texts)
+
+
+def unwrap_whisper_model(model):
+    """Returns the openai-whisper model behind an STT backend, or raises ValueError."""
+    inner = getattr(model, "model", model)
+    if not hasattr(inner, "embed_audio") or not hasattr(inner, "logits"):
+        raise ValueError("This decoding mode needs the 'whisper' STT backend")
+    return inner
+
+
+def is_whisper_model(model):
+    """True if 'model' (an STT backend or bare model) exposes whisper's encoder/decoder."""
+    try:
+        unwrap_whisper_model(model)
+        return True
+    except ValueError:
+        return False
+
+
+def get_tokenizer(wmodel, language):
+    """Whisper tokenizer for transcription in 'language' (name or code)."""
+    from whisper.tokenizer import get_tokenizer as whisper_tokenizer
+    return whisper_tokenizer(wmodel.is_multilingual, num_languages=wmodel.num_languages,
+                             language=language.lower() if language else None, task="transcribe")
+
+
+def encode_audio(wmodel, audio, short=False):
+    """
+    Runs the encoder once over the log-mel of 'audio'. Normally that is the
+    30 s padded window; with 'short' (and a clip up to SHORT_AUDIO_MAX_SECONDS)
+    see encode_short_audio().
+    """
+    import whisper
+    audio = np.asarray(audio, dtype=np.float32)
+    if short and len(audio) <= SHORT_AUDIO_MAX_SECONDS * SAMPLE_RATE:
+        return encode_short_audio(wmodel, audio)
+    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels=wmodel.dims.n_mels)
+    return wmodel.embed_audio(mel[None].to(wmodel.device))
+
+
+def encode_short_audio(wmodel, audio):
+    """
+    Short-utterance encoder: computes the log-mel only for the real duration
+    (plus SHORT_AUDIO_PAD_SECONDS) and runs the encoder with a shortened audio
+    context, slicing the positional embedding to match (the same idea as
+    whisper.cpp's audio_ctx). Encoder cost scales with the clip, not 30 s.
+    """
+    import torch
+    import torch.nn.functional as F
+    import whisper
+
+    pad = int(SHORT_AUDIO_PAD_SECONDS * SAMPLE_RATE)
+    n_frames = (len(audio) + pad) // HOP_LENGTH
+    n_frames += n_frames % 2 # conv2 has stride 2
+    mel = whisper.log_mel_spectrogram(audio, n_mels=wmodel.dims.n_mels, padding=pad)[:, :n_frames]
+
+    encoder = wmodel.encoder
+    x = mel[None].to(wmodel.device)
+    x = F.gelu(encoder.conv1(x))
+    x = F.gelu(encoder.conv2(x))
+    x = x.permute(0, 2, 1)
+    x = (x + encoder.positional_embedding[:x.shape[1]]).to(x.dtype)
+    for block in encoder.blocks:
+        x = block(x)
+    return encoder.ln_post(x)
+
+
+def decode_tokens(wmodel, audio_features, tokenizer, prompt_tokens=None, max_tokens=MAX_DECODE_TOKENS,
+                  temperature=0.0, stop=None, trie=None):
+    """
+    Minimal decoder over precomputed audio features (of any length, which
+    whisper.decode() does not accept), using whisper's kv-cache hooks. Greedy
+    at temperature 0, sampled otherwise. 'stop(tokens)' may end decoding early
+    by returning a reason string, except "match": a prefix of a longer reply
+    matches too, so a match only counts when <|endoftext|> comes right after
+    it (one more decoder step). With a DeckTrie, the logits are masked at
+    every step to the continuations that stay inside the deck.
+    Returns (text tokens without <|endoftext|>, sum of logprobs, steps, stop reason).
+    """
+    import torch
+
+    initial = list(tokenizer.sot_sequence_including_notimestamps)
+    if prompt_tokens is not None and len(prompt_tokens):
+        initial = [tokenizer.sot_prev] + [int(t) for t in prompt_tokens][-(wmodel.dims.n_text_ctx // 2 - 1):] + initial
+
+    generated = []
+    sum_logprob = 0.0
+    steps = 0
+    reason = "budget"
+    matched = False
+    cache, hooks = wmodel.install_kv_cache_hooks()
+    try:
+        x = torch.tensor([initial], device=wmodel.device)
+        for step in range(max_tokens):
+            choices = trie.allowed(generated) if trie is not None else None
+            if choices == [tokenizer.eot]:
+                reason = "match" if matched else "eot" # The phrase is complete; no need to ask the decoder
+                break
+            logits = wmodel.decoder(x, audio_features, kv_cache=cache)[0, -1].float()
+            steps += 1
+            if choices is not None:
+                mask = torch.full_like(logits, -np.inf)
+                mask[choices] = 0
+                logits += mask
+            # Only text tokens or <|endoftext|>; no timestamps/special tokens
+            logits[tokenizer.eot + 1:] = -np.inf
+            if step == 0:
+                logits[tokenizer.eot] = -np.inf # Don't accept an empty transcript
+            if temperature > 0:
+                token = int(torch.multinomial(torch.softmax(logits / temperature, dim=-1), 1))
+            else:
+                token = int(logits.argmax())
+            sum_logprob += float(torch.log_softmax(logits, dim=-1)[token])
+            if token == tokenizer.eot:
+                reason = "match" if matched else "eot"
+                break
+            generated.append(token)
+            if stop is not None:
+                stopped = stop(generated)
+                matched = stopped == "match"
+                if stopped and not matched:
+                    reason = stopped
+                    break
+            x = torch.tensor([[token]], device=wmodel.device)
+    finally:
+        for hook in hooks:
+            hook.remove()
+    return generated, sum_logprob, steps, reason
+
+
+def decode_batch(wmodel, audio_features, tokenizers, prompts, max_tokens=MAX_DECODE_TOKENS):
+    """
+    Greedy decoding of a batch in one decoder pass per step: row i of
+    'audio_features' is decoded with tokenizers[i] (its language) and its own
+    prompt token ids prompts[i] (or None). Whisper's decoder has no padding
+    mask, so shorter prompts are left-padded with whitespace tokens to put
+    every row's <|startoftranscript|> at the same position. Finished rows
+    ride along until the whole batch reaches <|endoftext|>.
+    Returns one list of text tokens (without <|endoftext|>) per row.
+    """
+    import torch
+
+    tokenizer = tokenizers[0] # Text and special token ids are shared by every language
+    n_prompt = wmodel.dims.n_text_ctx // 2 - 1
+    prompts = [[int(t) for t in prompt][-n_prompt:] if prompt is not None and len(prompt) else []
+               for prompt in prompts]
+    longest = max(len(prompt) for prompt in prompts)
+    pad = tokenizer.encode(" ")[0]
+    initial = []
+    for row_tokenizer, prompt in zip(tokenizers, prompts):
+        sot = list(row_tokenizer.sot_sequence_including_notimestamps)
+        if longest:
+            sot = [tokenizer.sot_prev] + [pad] * (longest - len(prompt)) + prompt + sot
+        initial.append(sot)
+
+    generated = [[] for _ in prompts]
+    finished = torch.zeros(len(prompts), dtype=torch.bool, device=wmodel.device)
+    cache, hooks = wmodel.install_kv_cache_hooks()
+    try:
+        x = torch.tensor(initial, device=wmodel.device)
+        for step in range(max_tokens):
+            logits = wmodel.decoder(x, audio_features, kv_cache=cache)[:, -1].float()
+            logits[:, tokenizer.eot + 1:] = -np.inf
+            if step == 0:
+                logits[:, tokenizer.eot] = -np.inf # Don't accept an empty transcript
+            tokens = logits.argmax(dim=-1)
+            tokens[finished] = tokenizer.eot
+            for i, token in enumerate(tokens.tolist()):
+                if token != tokenizer.eot:
+                    generated[i].append(token)
+            finished |= tokens == tokenizer.eot
+            if bool(finished.all()):
+                break
+            x = tokens[:, None]
+    finally:
+        for hook in hooks:
+            hook.remove()
+    return generated
+
+
+def transcribe_short(model, audio, language="French", prompt_text=None, prompt_tokens=None):
+    """
+    Short-utterance transcription: shortened-context encoder + greedy decoding.
+    'prompt_tokens' (e.g. from a compiled deck) saves tokenizing 'prompt_text'.
+    Returns whisper's {"text": ...} shape so it drops into transcribe_audio().
+    """
+    import torch
+
+    wmodel = unwrap_whisper_model(model)
+    tokenizer = get_tokenizer(wmodel, language)
+    if prompt_tokens is None and prompt_text:
+        prompt_tokens = tokenizer.encode(" " + prompt_text.strip())
+    with torch.no_grad():
+        audio_features = encode_audio(wmodel, audio, short=True)
+        tokens, _, _, _ = decode_tokens(wmodel, audio_features, tokenizer, prompt_tokens)
+    return {"text": tokenizer.decode(tokens)}
+
+
+def decode_with_budget(model, audio, expected_text, language="French", profile="bounded",
+                       short=False, max_retries=None, trie=None, expected_tokens=None):
+    """
+    Decodes 'audio' under a DecodeProfile (name or instance) tied to the
+    expected phrase: the token budget scales with the phrase's token count,
+    decoding stops early on a clear divergence, a confirmed match (the
+    decoder ends the text on the expected words) skips the rest, and temperature
+    fallback (limited to 'max_retries' retries, if given) re-runs only the
+    decoder. The expected phrase is also the initial prompt, as in
+    transcribe_audio(), tokenized unless 'expected_tokens' is given (e.g. from
+    a compiled deck). A DeckTrie restricts the output to deck phrases.
+    Returns a DecodeResult.
+    """
+    import torch
+
+    if isinstance(profile, str):
+        profile = DECODE_PROFILES[profile]
+    wmodel = unwrap_whisper_model(model)
+    tokenizer = get_tokenizer(wmodel, language)
+    if expected_tokens is None:
+        expected_tokens = tokenizer.encode(" " + expected_text.strip())
+    expected_words = normalize_words(expected_text)
+    budget = profile.token_budget(len(expected_tokens))
+    temperatures = profile.temperatures
+    if max_retries is not None:
+        temperatures = temperatures[:max_retries + 1]
+
+    def stop(tokens):
+        words = normalize_words(tokenizer.decode(tokens))
+        if profile.early_exit and words == expected_words:
+            return "match"
+        if profile.diverge_words is not None:
+            # The last word may still be growing; judge only the finished ones
+            strays = sum(1 for word in words[:-1] if word not in expected_words)
+            if strays >= profile.diverge_words or len(words) > len(expected_words) + profile.diverge_words:
+                return "diverged"
+        return None
+
+    steps = 0
+    best = None
+    with torch.no_grad():
+        audio_features = encode_audio(wmodel, audio, short=short)
+        for attempt, temperature in enumerate(temperatures):
+            tokens, sum_logprob, used, reason = decode_tokens(
+                wmodel, audio_features, tokenizer, expected_tokens, budget, temperature, stop, trie)
+            steps += used
+            avg_logprob = sum_logprob / max(1, used)
+            if best is None or reason == "match" or avg_logprob > best[1]:
+                best = (tokens, avg_logprob, reason, temperature)
+            if reason == "match" or (reason != "budget" and avg_logprob >= profile.logprob_threshold):
+                break
+
+    tokens, avg_logprob, reason, temperature = best
+    return DecodeResult(tokenizer.decode(tokens), steps, attempt, reason, avg_logprob, temperature)
+
+
+class ForcedScore:
+    """Result of score_expected(): per-token and per-word confidence plus a verdict."""
+    def __init__(self, token_scores, word_scores, mean_logprob, passed):
+        self.token_scores = token_scores # [(token_text, logprob)], ending with <|endoftext|>
+        self.word_scores = word_scores   # [(word, probability)]
+        self.mean_logprob = mean_logprob
+        self.passed = passed
+
+
+def score_expected(model, audio, expected_text, language="French", short=False):
+    """
+    Forced-alignment scoring: encodes the audio once and teacher-forces the
+    expected phrase's tokens through the decoder in a single pass, instead of
+    searching for a free transcription. Returns a ForcedScore with the
+    log-probability of every expected token, word confidences and a pass/fail
+    verdict (see FORCED_PASS_MEAN_LOGPROB / FORCED_PASS_WORD_PROB).
+    With 'short', the audio is encoded with the short-utterance encoder.
+    """
+    import torch
+
+    wmodel = unwrap_whisper_model(model)
+    tokenizer = get_tokenizer(wmodel, language)
+    text_tokens = tokenizer.encode(" " + expected_text.strip())
+    prefix = list(tokenizer.sot_sequence_including_notimestamps)
+    tokens = prefix + text_tokens + [tokenizer.eot]
+
+    with torch.no_grad():
+        audio_features = encode_audio(wmodel, audio, short=short)
+        logits = wmodel.logits(torch.tensor([tokens], device=wmodel.device), audio_features)
+        logprobs = torch.log_softmax(logits[0].float(), dim=-1)
+
+    # The logits at position i predict token i + 1
+    targets = tokens[len(prefix):]
+    positions = torch.arange(len(prefix) - 1, len(tokens) - 1)
+    target_logprobs = logprobs[positions, torch.tensor(targets)].tolist()
+    token_scores = [(tokenizer.decode([t]) if t != tokenizer.eot else "<|endoftext|>", lp)
+                    for t, lp in zip(targets, target_logprobs)]
+
+    # Group the text tokens into words (EOT excluded)
+    words, word_tokens = tokenizer.split_to_word_tokens(text_tokens)
+    word_scores = []
+    index = 0
+    for word, toks in zip(words, word_tokens):
+        word_lps = target_logprobs[index:index + len(toks)]
+        index += len(toks)
+        word_scores.append((word.strip(), float(np.exp(np.mean(word_lps)))))
+
+    mean_logprob = float(np.mean(target_logprobs))
+    passed = (mean_logprob >= FORCED_PASS_MEAN_LOGPROB
+              and all(prob >= FORCED_PASS_WORD_PROB for _, prob in word_scores))
+    return ForcedScore(token_scores, word_scores, mean_logprob, passed)
+
+
+# --- SHORT-UTTERANCE BENCHMARK ---
+def deck_benchmark_audio(content, speaker_id=None):
+    """
+    Yields (row, float32 16 kHz audio) for every deck row, synthesized with the
+    tutor's Piper voice. Without Piper, a noise burst of the phrase's estimated
+    spoken length (~75 ms per character) stands in, which still exercises the
+    encoder at the deck's real phrase lengths.
+    """
+    try:
+        import language_tutor_rpi as tutor
+        tutor.PIPER_VOICE = tutor.load_piper_voice()
+        if speaker_id is not None:
+            tutor.PIPER_SPEAKER_ID = speaker_id
+    except Exception as e:
+        print(f"Piper unavailable ({e}); using noise of the estimated phrase length.")
+        tutor = None
+
+    rng = np.random.default_rng(0)
+    for row in content:
+        if tutor is not None:
+            audio_bytes, sample_rate = tutor.synthesize_pcm(row['text'])
+            pcm = np.frombuffer(audio_bytes, dtype=np.int16).astype(np.float32) / 32768.0
+            audio = tutor_audio.resample(pcm, sample_rate, SAMPLE_RATE)
+        else:
+            seconds = max(0.5, 0.075 * len(row['text']))
+            audio = (0.05 * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+        yield row, audio
+
+
+def run_short_audio_benchmark(model_name, content_file, repeats=1):
+    """
+    Compares the regular transcribe_audio() path (model.transcribe with the
+    phrase as initial_prompt) against transcribe_short() on every deck phrase,
+    and returns per-phrase RTFs plus a summary.
+    """
+    import tutor_stt
+
+    with open(content_file, mode='r', encoding='utf-8') as file:
+        content = list(csv.DictReader(file))
+    model = tutor_stt.load_backend("whisper", model_name)
+
+    rows = []
+    for row, audio in deck_benchmark_audio(content):
+        duration = len(audio) / SAMPLE_RATE
+        timings = {}
+        texts = {}
+        for mode in ("full", "short"):
+            best = float('inf')
+            for _ in range(repeats):
+                start = time.perf_counter()
+                if mode == "full":
+                    result = model.transcribe(audio, language="French", initial_prompt=row['text'])
+                else:
+                    result = transcribe_short(model, audio, "French", row['text'])
+                best = min(best, time.perf_counter() - start)
+            timings[mode] = best
+            texts[mode] = result["text"].strip()
+        rows.append({
+            "text": row['text'], "duration": duration,
+            "rtf_full": timings["full"] / duration, "rtf_short": timings["short"] / duration,
+            "heard_full": texts["full"], "heard_short": texts["short"],
+        })
+        print(f"{row['text'][:28]:<28} {duration:5.2f}s  RTF full {rows[-1]['rtf_full']:6.2f}  "
+              f"short {rows[-1]['rtf_short']:6.2f}  | {texts['short']}")
+
+    full = np.array([r["rtf_full"] for r in rows])
+    short = np.array([r["rtf_short"] for r in rows])
+    summary = {
+        "model": model_name, "phrases": len(rows),
+        "rtf_full_median": float(np.median(full)), "rtf_short_median": float(np.median(short)),
+        "speedup_median": float(np.median(full / short)),
+    }
+    print(f"\nMedian RTF: full {summary['rtf_full_median']:.2f}, short {summary['rtf_short_median']:.2f} "
+          f"({summary['speedup_median']:.1f}x faster)")
+    return {"summary": summary, "phrases": rows}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark short-utterance decoding against transcribe_audio()")
+    parser.add_argument("--model", default="small", help="Whisper model size")
+    parser.add_argument("--content", default="tutor_content.csv", help="deck CSV")
+    parser.add_argument("--repeats", type=int, default=1, help="runs per phrase (best time is kept)")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    results = run_short_audio_benchmark(args.model, args.content, args.repeats)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
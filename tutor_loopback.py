@@ -0,0 +1,179 @@
+import os
+import csv
+import sys
+import json
+import time
+import hashlib
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import tutor_audio
+
+# --- TTS -> STT LOOPBACK ---
+# Speaks every deck row with each Piper speaker and feeds the clean audio
+# straight into transcribe_audio() (no speaker, no microphone). Records the
+# synthesis and transcription latency and the word match per phrase, and
+# flags the rows that are not recognized even from clean TTS: the learner
+# can never pass those, so they need rewording or a different model.
+# Rows are spread over worker processes, each with its own PiperVoice and
+# STT model, so the whole deck can be checked on a plain Linux box (Piper
+# is needed, PortAudio is not: nothing is played or recorded):
+#
+#   python tutor_loopback.py                          # every row, both speakers
+#   python tutor_loopback.py --model base --workers 2 -o loopback.json
+#
+# Exits with status 1 when any row is flagged, or when two speakers render
+# the same PCM (the speaker id is not reaching Piper, so the comparison
+# between speakers would be meaningless).
+
+WHISPER_SAMPLE_RATE = tutor_audio.WHISPER_SAMPLE_RATE
+MIN_ACCURACY = 1.0 # A phrase matches when score_comparison() reaches this for a speaker
+WORKER_STATE = {}  # Per worker process: tutor module, STT model, quiet stdout
+
+
+def _worker_init(backend, model_name, threads, verbose):
+    """Loads a private PiperVoice and STT model in each worker process."""
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads)) # Before torch is imported: no oversubscription
+    import language_tutor_rpi as tutor
+    import tutor_stt
+
+    tutor._prewarm_worker_init(tutor.PIPER_MODEL_PATH, tutor.PIPER_CONFIG_PATH)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    WORKER_STATE["tutor"] = tutor
+    WORKER_STATE["model"] = tutor_stt.load_backend(backend or tutor.STT_BACKEND, model_name or tutor.MODEL_NAME)
+    WORKER_STATE["stdout"] = sys.stderr if verbose else open(os.devnull, "w")
+
+
+def _loopback_one(index, text, speaker_id, use_prompt):
+    """Speaks one phrase with one speaker and transcribes it. Returns the result dict."""
+    tutor = WORKER_STATE["tutor"]
+    with contextlib.redirect_stdout(WORKER_STATE["stdout"]):
+        tutor.PIPER_SPEAKER_ID = speaker_id
+        start = time.perf_counter()
+        audio_bytes, sample_rate = tutor.synthesize_pcm(text, evict=False) # Also warms the tutor's cache
+        tts_time = time.perf_counter() - start
+
+        audio = np.frombuffer(audio_bytes, dtype=np.int16).astype(np.float32) / 32768.0
+        audio = tutor_audio.resample(audio, sample_rate, WHISPER_SAMPLE_RATE)
+        duration = len(audio) / WHISPER_SAMPLE_RATE
+        heard, transcribe_time, rtf = tutor.transcribe_audio(audio, WORKER_STATE["model"], tutor.LANGUAGE,
+                                                             text if use_prompt else None, duration)
+        accuracy, _ = tutor.score_comparison(text, heard)
+    return {"row": index, "text": text, "speaker": speaker_id, "heard": heard.strip(),
+            "pcm_sha256": hashlib.sha256(audio_bytes).hexdigest(), "duration": duration, "tts_time": tts_time, "transcribe_time": transcribe_time,
+            "rtf": rtf, "accuracy": accuracy}
+
+
+def summarize_rows(results, min_accuracy=MIN_ACCURACY):
+    """Groups per-speaker results by row: match rate, latency and whether the row is flagged."""
+    by_row = {}
+    for result in results:
+        by_row.setdefault(result["row"], []).append(result)
+    rows = []
+    for index in sorted(by_row):
+        attempts = sorted(by_row[index], key=lambda r: r["speaker"])
+        matched = [r["accuracy"] >= min_accuracy for r in attempts]
+        rows.append({
+            "row": index, "text": attempts[0]["text"],
+            "match_rate": float(np.mean(matched)),
+            "transcribe_time": max(r["transcribe_time"] for r in attempts),
+            "flagged": not all(matched),
+            "same_voice": len(attempts) > 1 and len({r["pcm_sha256"] for r in attempts}) == 1,
+            "speakers": attempts,
+        })
+    return rows
+
+
+def run_loopback(content, speakers, workers, backend=None, model_name=None, use_prompt=True, verbose=False):
+    """
+    Runs every (row, speaker) pair across 'workers' processes. Returns
+    (per-row summaries, failures) where failures are pairs that raised.
+    """
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    results, failures = [], []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init,
+                             initargs=(backend, model_name, threads, verbose)) as pool:
+        futures = {pool.submit(_loopback_one, index, row['text'], speaker_id, use_prompt): (index, speaker_id)
+                   for index, row in enumerate(content) for speaker_id in speakers}
+        for done, future in enumerate(as_completed(futures), 1):
+            index, speaker_id = futures[future]
+            try:
+                results.append(future.result())
+            except BrokenProcessPool:
+                raise # A worker died (e.g. its voice or model failed to load): nothing else will run
+            except Exception as e:
+                failures.append({"row": index, "speaker": speaker_id, "error": f"{type(e).__name__}: {e}"})
+            print(f"\r   {done}/{len(futures)} checked", end="", flush=True)
+    print()
+    return summarize_rows(results), failures
+
+
+def print_report(rows, failures):
+    """Prints the flagged rows and the deck-wide totals."""
+    flagged = [row for row in rows if row["flagged"]]
+    for row in flagged:
+        print(f"❌ Row {row['row'] + 1}: {row['text']}")
+        for attempt in row["speakers"]:
+            print(f"     speaker {attempt['speaker']}: {attempt['accuracy']:.0%} heard \"{attempt['heard']}\"")
+    for failure in failures:
+        print(f"⚠️ Row {failure['row'] + 1}, speaker {failure['speaker']}: {failure['error']}")
+    if rows:
+        times = [attempt["transcribe_time"] for row in rows for attempt in row["speakers"]]
+        match_rate = float(np.mean([row["match_rate"] for row in rows]))
+        print(f"{len(rows)} rows, {len(flagged)} flagged | match rate {match_rate:.0%} | "
+              f"transcription p50 {np.percentile(times, 50):.2f}s p95 {np.percentile(times, 95):.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that every deck row is recognized from clean Piper TTS")
+    parser.add_argument("--content", default="tutor_content.csv", help="deck CSV to check")
+    parser.add_argument("--speakers", type=int, nargs="+", default=[0, 1],
+                        help="Piper speaker ids (JESSICA_ID=0, PIERRE_ID=1)")
+    parser.add_argument("--model", help="STT model size (default: the tutor's MODEL_NAME)")
+    parser.add_argument("--backend", help="STT backend (default: the tutor's STT_BACKEND)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--no-prompt", action="store_true",
+                        help="don't prime the model with the expected phrase (stricter)")
+    parser.add_argument("-o", "--output", help="also write the per-row results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="show the tutor's own output")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.content):
+        print(f"FATAL: Content file not found: {args.content}")
+        sys.exit(1)
+    try:
+        import piper # Only checked here: the workers load the voice
+    except ImportError:
+        print("FATAL: Piper is not installed (pip install piper-tts); the loopback needs it to speak the deck.")
+        sys.exit(1)
+    with open(args.content, mode='r', encoding='utf-8') as file:
+        content = [row for row in csv.DictReader(file) if row.get('text')]
+
+    print(f"▶️ Loopback of {len(content)} rows x {len(args.speakers)} speakers with {args.workers} workers...")
+    start_time = time.time()
+    try:
+        rows, failures = run_loopback(content, args.speakers, args.workers, args.backend, args.model,
+                                      use_prompt=not args.no_prompt, verbose=args.verbose)
+    except BrokenProcessPool:
+        print("\nFATAL: A loopback worker died. Check that the Piper voice and STT model load "
+              "(rerun with --workers 1 --verbose).")
+        sys.exit(1)
+    print_report(rows, failures)
+    same_voice = [row for row in rows if row["same_voice"]]
+    if same_voice:
+        print(f"❌ Speakers {args.speakers} rendered identical audio for {len(same_voice)} rows; "
+              "the speaker id is not applied by Piper.")
+    print(f"✅ Done in {time.time() - start_time:.1f} seconds")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"content": args.content, "speakers": args.speakers, "model": args.model,
+                       "backend": args.backend, "prompted": not args.no_prompt,
+                       "rows": rows, "failures": failures}, f, ensure_ascii=False, indent=2)
+    sys.exit(1 if failures or same_voice or any(row["flagged"] for row in rows) else 0)
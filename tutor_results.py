@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import wave
+import queue
+import argparse
+import threading
+import collections
+import numpy as np
+
+# --- SESSION RESULTS LOG ---
+# Append-only JSONL log of every round (phrase, transcript, word alignment,
+# timings). append() only queues the record; a writer thread serializes
+# batches, fsyncs once per batch and rotates segments, so logging never adds
+# latency to the interactive loop. read_results() streams the segments back
+# for analytics:
+#
+#   python tutor_results.py             # summary of every logged session
+#   python tutor_results.py --days 7    # ... of the last week
+
+RESULTS_DIR = os.path.expanduser("~/.local/share/language-tutor/results")
+SEGMENT_MAX_BYTES = 8 * 1024 * 1024 # Rotate to a new segment past this size
+BATCH_MAX_RECORDS = 64              # fsync at least every this many records...
+BATCH_MAX_SECONDS = 2.0             # ... or this long after the first queued one
+SEGMENT_PREFIX = "results-"
+_STOP = object()
+
+
+def segment_start(name):
+    """Start time (epoch ms) encoded in a segment file name."""
+    return int(name[len(SEGMENT_PREFIX):].split(".")[0])
+
+
+class ResultsLog:
+    """
+    Buffered, append-only writer for round results. Records are dicts of
+    JSON-serializable values; an optional float32 16 kHz recording is saved
+    as a WAV next to the log by the writer thread (the record gets its path).
+    """
+    def __init__(self, directory=RESULTS_DIR, segment_max_bytes=SEGMENT_MAX_BYTES,
+                 batch_records=BATCH_MAX_RECORDS, batch_seconds=BATCH_MAX_SECONDS):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.batch_records = batch_records
+        self.batch_seconds = batch_seconds
+        self.session = time.strftime("%Y%m%d-%H%M%S")
+        self.written = 0
+        self.batches = 0
+        self._audio_files = 0
+        os.makedirs(directory, exist_ok=True)
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._thread = threading.Thread(target=self._run, name="results-log", daemon=True)
+        self._thread.start()
+
+    def append(self, record, audio=None, sample_rate=16000):
+        """Queues one round's record (returns immediately)."""
+        record = dict(record, session=self.session, ts=record.get("ts", time.time()))
+        self._queue.put((record, audio, sample_rate))
+
+    def close(self):
+        """Writes and fsyncs everything queued, then stops the writer thread."""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _open_segment(self):
+        if self._file is not None:
+            self._file.close()
+        path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{int(time.time() * 1000):013d}.jsonl")
+        self._file = open(path, "ab")
+
+    def _save_audio(self, record, audio, sample_rate):
+        audio_dir = os.path.join(self.directory, "audio")
+        os.makedirs(audio_dir, exist_ok=True)
+        # Named by round; records without one get a sequence number (never the
+        # timestamp: two records in the same second would overwrite each other)
+        self._audio_files += 1
+        name = record.get('round', f"n{self._audio_files}")
+        path = os.path.join(audio_dir, f"{record['session']}-{name}.wav")
+        pcm = (np.clip(np.asarray(audio, dtype=np.float32), -1.0, 1.0) * 32767).astype(np.int16)
+        with wave.open(path, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(sample_rate)
+            wf.writeframes(pcm.tobytes())
+        record["audio"] = path
+
+    def _write_batch(self, batch):
+        if self._file is None or self._file.tell() >= self.segment_max_bytes:
+            self._open_segment()
+        lines = []
+        for record, audio, sample_rate in batch:
+            if audio is not None:
+                try:
+                    self._save_audio(record, audio, sample_rate)
+                except Exception as e:
+                    record["audio_error"] = str(e)
+            lines.append(json.dumps(record, ensure_ascii=False, default=float))
+        self._file.write(("\n".join(lines) + "\n").encode("utf-8"))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.written += len(batch)
+        self.batches += 1
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.batch_seconds
+            while len(batch) < self.batch_records:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                print(f"⚠️ Could not write {len(batch)} results: {e}")
+        if self._file is not None:
+            self._file.close()
+
+
+def read_results(directory=RESULTS_DIR, since=None, fields=None):
+    """
+    Yields the logged records in order, optionally only those at or after
+    'since' (epoch seconds; whole segments that end before it are skipped
+    without being read) and only the given 'fields'.
+    """
+    if not os.path.isdir(directory):
+        return
+    segments = sorted(name for name in os.listdir(directory)
+                      if name.startswith(SEGMENT_PREFIX) and name.endswith(".jsonl"))
+    for i, name in enumerate(segments):
+        if since is not None and i + 1 < len(segments) and segment_start(segments[i + 1]) / 1000 <= since:
+            continue
+        with open(os.path.join(directory, name), "rb") as f:
+            data = f.read()
+        for line in data.splitlines():
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # Torn last line of a crashed session
+            if since is not None and record.get("ts", 0) < since:
+                continue
+            if fields is not None:
+                record = {key: record.get(key) for key in fields}
+            yield record
+
+
+def summarize(records):
+    """Aggregates results records into session totals, accuracy, RTF percentiles and the hardest phrases."""
+    sessions = set()
+    accuracies = []
+    rtfs = []
+    by_phrase = collections.defaultdict(list)
+    for record in records:
+        sessions.add(record.get("session"))
+        if record.get("accuracy") is not None:
+            accuracies.append(record["accuracy"])
+            by_phrase[record.get("phrase")].append(record["accuracy"])
+        if record.get("rtf") is not None:
+            rtfs.append(record["rtf"])
+    hardest = sorted(((float(np.mean(scores)), phrase, len(scores)) for phrase, scores in by_phrase.items()))[:5]
+    return {
+        "rounds": len(accuracies), "sessions": len(sessions),
+        "mean_accuracy": float(np.mean(accuracies)) if accuracies else None,
+        "perfect_rate": float(np.mean([a >= 1.0 for a in accuracies])) if accuracies else None,
+        "rtf_p50": float(np.percentile(rtfs, 50)) if rtfs else None,
+        "rtf_p95": float(np.percentile(rtfs, 95)) if rtfs else None,
+        "hardest": [{"phrase": phrase, "mean_accuracy": mean, "attempts": n} for mean, phrase, n in hardest],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the tutor's session results log")
+    parser.add_argument("--dir", default=RESULTS_DIR, help="results log directory")
+    parser.add_argument("--days", type=float, help="only the last N days")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    since = time.time() - args.days * 86400 if args.days else None
+    summary = summarize(read_results(args.dir, since, fields=("session", "phrase", "accuracy", "rtf")))
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    elif not summary["rounds"]:
+        print("No results logged yet.")
+    else:
+        print(f"{summary['rounds']} rounds over {summary['sessions']} sessions")
+        print(f"Mean word accuracy: {summary['mean_accuracy']:.0%} (perfect: {summary['perfect_rate']:.0%})")
+        if summary["rtf_p50"] is not None:
+            print(f"RTF p50 {summary['rtf_p50']:.2f}, p95 {summary['rtf_p95']:.2f}")
+        print("Hardest phrases:")
+        for entry in summary["hardest"]:
+            print(f"  {entry['mean_accuracy']:.0%}  {entry['phrase']} ({entry['attempts']} attempts)")
@@ -0,0 +1,256 @@
+import os
+import time
+import heapq
+import random
+import sqlite3
+import bisect
+import threading
+import tutor_store
+
+# --- SPACED REPETITION (SM-2) ---
+# Picks the next phrase from a heap of due reviews instead of random.choice().
+# Every reviewed phrase has an SM-2 state (easiness, repetitions, interval) and
+# a due time; results update it and push a new heap entry (O(log n)), with
+# stale entries skipped lazily. Phrases never reviewed are introduced at random
+# from a pool of unreviewed rows (O(1) per pick) when nothing is due. With the
+# phrase store, rows are found by their stable phrase id (binary search in the
+# selection's sorted ids), so tag filters can change between sessions without
+# any scan. State lives in SQLite and each result rewrites only its own row,
+# so a session never rewrites the whole schedule.
+
+SCHEDULE_FILE = os.path.expanduser("~/.local/share/language-tutor/schedule.db")
+DAY_SECONDS = 86400
+INITIAL_EASINESS = 2.5
+MIN_EASINESS = 1.3
+LAPSE_DELAY_SECONDS = 120 # A failed phrase comes back later in the same session
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    phrase TEXT PRIMARY KEY,
+    easiness REAL NOT NULL,
+    repetitions INTEGER NOT NULL,
+    interval_days REAL NOT NULL,
+    due REAL NOT NULL,
+    phrase_id INTEGER,
+    reviewed_at REAL NOT NULL
+)
+"""
+COLUMNS = "phrase, easiness, repetitions, interval_days, due, phrase_id, reviewed_at"
+
+
+def quality_from_accuracy(accuracy):
+    """Maps a word accuracy (0..1) to an SM-2 response quality (0..5)."""
+    if accuracy >= 1.0:
+        return 5
+    if accuracy >= 0.8:
+        return 4
+    if accuracy >= 0.6:
+        return 3
+    if accuracy >= 0.4:
+        return 2
+    return 1 if accuracy > 0 else 0
+
+
+class ReviewState:
+    """SM-2 state of one phrase."""
+    __slots__ = ("easiness", "repetitions", "interval_days", "due", "phrase_id", "version")
+
+    def __init__(self, easiness=INITIAL_EASINESS, repetitions=0, interval_days=0.0, due=0.0, phrase_id=None):
+        self.easiness = easiness
+        self.repetitions = repetitions
+        self.interval_days = interval_days
+        self.due = due
+        self.phrase_id = phrase_id # The phrase store's id, once reviewed from the store
+        self.version = 0
+
+    def update(self, quality, now):
+        """Applies one SM-2 review with response quality 0..5."""
+        if quality < 3:
+            self.repetitions = 0
+            self.interval_days = 0.0
+            self.due = now + LAPSE_DELAY_SECONDS
+        else:
+            if self.repetitions == 0:
+                self.interval_days = 1.0
+            elif self.repetitions == 1:
+                self.interval_days = 6.0
+            else:
+                self.interval_days = round(self.interval_days * self.easiness)
+            self.repetitions += 1
+            self.due = now + self.interval_days * DAY_SECONDS
+        self.easiness = max(MIN_EASINESS,
+                            self.easiness + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+
+class Scheduler:
+    """
+    SM-2 scheduler over a deck ('content': the tutor's list of dicts, compiled
+    deck or phrase-store selection). Phrases are keyed by their text; rows are
+    addressed by a key: the store's phrase id for a PhraseSelection, else the
+    row's position (found from its text through an index built at start-up,
+    in the same pass that collects the unreviewed rows).
+    next_item() hands a phrase out and takes it off the heap until
+    record_result() (or release(), if the attempt was lost) puts it back.
+    Thread-safe: the TTS prefetch worker picks phrases.
+    """
+    def __init__(self, content, db_path=SCHEDULE_FILE, clock=time.time):
+        self.content = content
+        self.clock = clock
+        self.states = {}
+        self._heap = []       # (due, version, phrase)
+        self._out = {}        # Phrases handed out and not yet recorded -> row key
+        self._store_ids = content.ids if isinstance(content, tutor_store.PhraseSelection) else None
+        self._text_index = None
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(reviews)")}
+        if "phrase_id" not in columns:
+            # Schedules written before phrase ids (their row_hint column is no longer read)
+            with self._conn:
+                self._conn.execute("ALTER TABLE reviews ADD COLUMN phrase_id INTEGER")
+        for phrase, easiness, repetitions, interval_days, due, phrase_id, _ in \
+                self._conn.execute(f"SELECT {COLUMNS} FROM reviews"):
+            self.states[phrase] = ReviewState(easiness, repetitions, interval_days, due, phrase_id)
+        self._heap = [(state.due, 0, phrase) for phrase, state in self.states.items()]
+        heapq.heapify(self._heap)
+
+        # Unreviewed rows, picked at random and removed by swapping with the last one
+        if self._store_ids is not None:
+            reviewed = {state.phrase_id for state in self.states.values() if state.phrase_id is not None}
+            self._new = [phrase_id for phrase_id in self._store_ids if phrase_id not in reviewed]
+        else:
+            self._text_index = {row['text']: i for i, row in enumerate(content)}
+            self._new = [i for text, i in self._text_index.items() if text not in self.states]
+        self._new_slot = {key: slot for slot, key in enumerate(self._new)}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _row(self, key):
+        return self.content.store.fetch(key) if self._store_ids is not None else self.content[key]
+
+    def _row_key(self, row):
+        """The key of a row handed out by next_item()."""
+        if self._store_ids is not None:
+            return row.get('id')
+        return self._text_index.get(row['text'])
+
+    def _find_key(self, phrase, state):
+        """The row key for a scheduled phrase, or None if it is not in this deck or selection."""
+        if self._store_ids is None:
+            return self._text_index.get(phrase)
+        if state.phrase_id is None:
+            return None # Reviewed from a CSV/deck only; adopted when the store picks it as new
+        position = bisect.bisect_left(self._store_ids, state.phrase_id)
+        if position < len(self._store_ids) and self._store_ids[position] == state.phrase_id:
+            return state.phrase_id
+        return None
+
+    def _take_new(self, key):
+        """Removes 'key' from the unreviewed pool (O(1)); returns whether it was there."""
+        slot = self._new_slot.pop(key, None)
+        if slot is None:
+            return False
+        last = self._new.pop()
+        if last != key:
+            self._new[slot] = last
+            self._new_slot[last] = slot
+        return True
+
+    def _put_new(self, key):
+        if key is not None and key not in self._new_slot:
+            self._new_slot[key] = len(self._new)
+            self._new.append(key)
+
+    def _pop_due(self, now):
+        """Pops the earliest valid heap entry due by 'now', as (phrase, row key), or None."""
+        while self._heap:
+            due, version, phrase = self._heap[0]
+            state = self.states.get(phrase)
+            if state is None or version != state.version or phrase in self._out:
+                heapq.heappop(self._heap) # Stale entry
+                continue
+            if due > now:
+                return None
+            heapq.heappop(self._heap)
+            key = self._find_key(phrase, state)
+            if key is None:
+                continue # Phrase no longer in this deck
+            return phrase, key
+        return None
+
+    def _pick_new(self):
+        """A random phrase that was never reviewed, as (phrase, row key), or None once every phrase has been."""
+        while self._new:
+            key = self._new[random.randrange(len(self._new))]
+            self._take_new(key)
+            phrase = self._row(key)['text']
+            if phrase not in self._out:
+                return phrase, key
+        return None
+
+    def next_item(self):
+        """
+        Returns the next phrase row: the most overdue review, else a new
+        phrase, else the review that comes due soonest.
+        """
+        with self._lock:
+            now = self.clock()
+            picked = self._pop_due(now) or self._pick_new() or self._pop_due(float('inf'))
+            if picked is None:
+                # Every phrase is handed out already (tiny deck); fall back to random
+                return random.choice(self.content)
+            phrase, key = picked
+            self._out[phrase] = key
+            return self._row(key)
+
+    def release(self, row):
+        """Returns a handed-out phrase unchanged (e.g. the recording failed)."""
+        with self._lock:
+            phrase = row['text']
+            key = self._out.pop(phrase, None)
+            state = self.states.get(phrase)
+            if state is not None and (self._store_ids is None or state.phrase_id is not None):
+                heapq.heappush(self._heap, (state.due, state.version, phrase))
+            else:
+                self._put_new(key)
+
+    def record_result(self, row, quality):
+        """Applies an SM-2 review (quality 0..5) to 'row' and persists only that phrase. Returns its state."""
+        with self._lock:
+            now = self.clock()
+            phrase = row['text']
+            key = self._out.pop(phrase, None)
+            if key is None:
+                key = self._row_key(row)
+            self._take_new(key) # Also covers rows that did not come from next_item()
+            state = self.states.get(phrase)
+            if state is None:
+                state = self.states[phrase] = ReviewState()
+            state.update(quality, now)
+            state.version += 1
+            if self._store_ids is not None and key is not None:
+                state.phrase_id = key
+            heapq.heappush(self._heap, (state.due, state.version, phrase))
+
+            with self._conn:
+                self._conn.execute(
+                    f"INSERT INTO reviews ({COLUMNS}) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(phrase) DO UPDATE SET "
+                    "easiness = excluded.easiness, repetitions = excluded.repetitions, "
+                    "interval_days = excluded.interval_days, due = excluded.due, "
+                    "phrase_id = COALESCE(excluded.phrase_id, phrase_id), reviewed_at = excluded.reviewed_at",
+                    (phrase, state.easiness, state.repetitions, state.interval_days, state.due,
+                     state.phrase_id, now))
+            return state
+
+    def due_count(self):
+        """Number of reviews due now (for the session banner)."""
+        with self._lock:
+            now = self.clock()
+            return sum(1 for phrase, state in self.states.items()
+                       if state.due <= now and phrase not in self._out)
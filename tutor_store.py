@@ -0,0 +1,225 @@
+import os
+import csv
+import array
+import sqlite3
+import argparse
+import threading
+
+# --- PHRASE STORE ---
+# Indexed SQLite store for large decks (100k+ rows). The tutor keeps only the
+# ids of the selected phrases in memory (8 bytes each) and fetches a row when
+# it is picked, instead of holding the whole CSV as a list of dicts.
+#
+#   python tutor_store.py import tutor_content.csv --db tutor_content.db --tags basics --difficulty 1
+#   python language_tutor_rpi.py --store tutor_content.db --tag basics --max-difficulty 2
+#
+# Besides text/source/translation/notes, a CSV may carry optional "language",
+# "difficulty" (integer) and "tags" ("|"-separated) columns; the import
+# options fill them in for CSVs that don't. A phrase is unique per
+# (text, language): importing a CSV again updates its rows and adds tags
+# instead of duplicating them.
+
+PHRASE_COLUMNS = ("text", "source", "translation", "notes")
+TAG_SEPARATOR = "|"
+DEFAULT_LANGUAGE = "fr"
+IMPORT_BATCH_ROWS = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS phrases (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    source TEXT,
+    translation TEXT,
+    notes TEXT,
+    language TEXT NOT NULL,
+    difficulty INTEGER
+);
+CREATE TABLE IF NOT EXISTS phrase_tags (
+    tag TEXT NOT NULL,
+    phrase_id INTEGER NOT NULL REFERENCES phrases(id) ON DELETE CASCADE,
+    PRIMARY KEY (tag, phrase_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS phrases_language_difficulty ON phrases(language, difficulty);
+CREATE INDEX IF NOT EXISTS phrases_difficulty ON phrases(difficulty);
+CREATE INDEX IF NOT EXISTS phrase_tags_phrase ON phrase_tags(phrase_id);
+"""
+# An index rather than a table constraint, so stores created before it get it too
+UNIQUE_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS phrases_text_language ON phrases(text, language)"
+
+
+def parse_tags(value):
+    return [tag.strip() for tag in (value or "").split(TAG_SEPARATOR) if tag.strip()]
+
+
+class PhraseStore:
+    """
+    An open phrase database. One connection is shared between the tutor's
+    threads (the TTS prefetch worker picks rows too), guarded by a lock.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.executescript(SCHEMA)
+        self._add_unique_index()
+        self._lock = threading.Lock()
+
+    def _add_unique_index(self):
+        """Creates the (text, language) index, first dropping duplicates left by older imports."""
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'phrases_text_language'").fetchone()
+        if exists:
+            return
+        with self._conn:
+            removed = self._conn.execute(
+                "DELETE FROM phrases WHERE id NOT IN (SELECT MIN(id) FROM phrases GROUP BY text, language)").rowcount
+            self._conn.execute(UNIQUE_INDEX)
+        if removed:
+            print(f"⚠️ Removed {removed} duplicate phrases from {self.db_path}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def import_csv(self, csv_path, language=DEFAULT_LANGUAGE, difficulty=None, tags=()):
+        """
+        Streams the rows of a tutor CSV into the store in batches. Per-row
+        "language"/"difficulty"/"tags" columns override the defaults given here.
+        Rows already in the store (same text and language) are updated, so
+        re-importing a CSV is idempotent. Returns the number of rows imported.
+        """
+        count = 0
+        with open(csv_path, mode='r', encoding='utf-8') as file, self._lock, self._conn:
+            batch = []
+            for row in csv.DictReader(file):
+                batch.append(row)
+                if len(batch) >= IMPORT_BATCH_ROWS:
+                    count += self._insert_batch(batch, language, difficulty, tags)
+                    batch = []
+            count += self._insert_batch(batch, language, difficulty, tags)
+        return count
+
+    def _insert_batch(self, rows, language, difficulty, tags):
+        for row in rows:
+            row_difficulty = row.get('difficulty') or difficulty
+            row_language = row.get('language') or language
+            self._conn.execute(
+                "INSERT INTO phrases (text, source, translation, notes, language, difficulty) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(text, language) DO UPDATE SET "
+                "source = excluded.source, translation = excluded.translation, notes = excluded.notes, "
+                "difficulty = COALESCE(excluded.difficulty, difficulty)",
+                (row['text'], row.get('source'), row.get('translation'), row.get('notes'), row_language,
+                 int(row_difficulty) if row_difficulty not in (None, "") else None))
+            # lastrowid is not set when the row was updated
+            phrase_id = self._conn.execute("SELECT id FROM phrases WHERE text = ? AND language = ?",
+                                           (row['text'], row_language)).fetchone()[0]
+            row_tags = set(tags) | set(parse_tags(row.get('tags')))
+            self._conn.executemany("INSERT OR IGNORE INTO phrase_tags (tag, phrase_id) VALUES (?, ?)",
+                                   [(tag, phrase_id) for tag in row_tags])
+        return len(rows)
+
+    def select(self, tags=None, language=None, min_difficulty=None, max_difficulty=None):
+        """
+        Returns a PhraseSelection of the phrases matching every given filter
+        (a phrase needs all of 'tags'). Only the matching ids are read, through
+        the indexes; rows are fetched when accessed.
+        """
+        clauses, params = [], []
+        if language:
+            clauses.append("p.language = ?")
+            params.append(language)
+        if min_difficulty is not None:
+            clauses.append("p.difficulty >= ?")
+            params.append(min_difficulty)
+        if max_difficulty is not None:
+            clauses.append("p.difficulty <= ?")
+            params.append(max_difficulty)
+        for tag in tags or ():
+            clauses.append("p.id IN (SELECT phrase_id FROM phrase_tags WHERE tag = ?)")
+            params.append(tag)
+        query = "SELECT p.id FROM phrases AS p"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY p.id"
+
+        ids = array.array("q")
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+            while chunk := cursor.fetchmany(IMPORT_BATCH_ROWS):
+                ids.extend(row[0] for row in chunk)
+        return PhraseSelection(self, ids)
+
+    def fetch(self, phrase_id):
+        """Returns one phrase as a dict (the CSV's keys plus language, difficulty and tags)."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM phrases WHERE id = ?", (phrase_id,)).fetchone()
+            if row is None:
+                raise KeyError(phrase_id)
+            tags = [r[0] for r in self._conn.execute(
+                "SELECT tag FROM phrase_tags WHERE phrase_id = ? ORDER BY tag", (phrase_id,))]
+        phrase = dict(row)
+        phrase['tags'] = tags
+        return phrase
+
+    def stats(self):
+        """Row count per language and tag count, for the CLI."""
+        with self._lock:
+            languages = self._conn.execute(
+                "SELECT language, COUNT(*) FROM phrases GROUP BY language ORDER BY language").fetchall()
+            tags = self._conn.execute(
+                "SELECT tag, COUNT(*) FROM phrase_tags GROUP BY tag ORDER BY tag").fetchall()
+        return [tuple(r) for r in languages], [tuple(r) for r in tags]
+
+
+class PhraseSelection:
+    """
+    Lazy sequence of selected phrases: holds only their ids and fetches a row
+    (a dict like the CSV rows) on access, so random.choice() and iteration
+    work as they do on the tutor's list of dicts.
+    """
+    def __init__(self, store, ids):
+        self.store = store
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        return self.store.fetch(self.ids[i])
+
+    def __iter__(self):
+        return (self.store.fetch(phrase_id) for phrase_id in self.ids)
+
+
+def open_selection(db_path, tags=None, language=None, min_difficulty=None, max_difficulty=None):
+    """Opens 'db_path' and returns the selected phrases (see PhraseStore.select)."""
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(db_path)
+    return PhraseStore(db_path).select(tags, language, min_difficulty, max_difficulty)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the tutor's indexed phrase store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="import a tutor CSV")
+    importer.add_argument("csv", help="CSV with text, source, translation, notes columns")
+    importer.add_argument("--db", default="tutor_content.db", help="SQLite store to create or extend")
+    importer.add_argument("--language", default=DEFAULT_LANGUAGE, help="language of rows without a 'language' column")
+    importer.add_argument("--difficulty", type=int, help="difficulty of rows without a 'difficulty' column")
+    importer.add_argument("--tags", default="", help=f"'{TAG_SEPARATOR}'-separated tags added to every row")
+    stats = commands.add_parser("stats", help="show row counts per language and tag")
+    stats.add_argument("--db", default="tutor_content.db", help="SQLite store")
+    args = parser.parse_args()
+
+    store = PhraseStore(args.db)
+    if args.command == "import":
+        count = store.import_csv(args.csv, args.language, args.difficulty, parse_tags(args.tags))
+        print(f"✅ Imported {count} phrases from {args.csv} into {args.db}")
+    else:
+        languages, tags = store.stats()
+        for language, count in languages:
+            print(f"{language}: {count} phrases")
+        for tag, count in tags:
+            print(f"  #{tag}: {count}")
+    store.close()
@@ -0,0 +1,260 @@
+import os
+import json
+import wave
+import socket
+import struct
+import logging
+import threading
+import numpy as np
+
+# --- STT BACKEND REGISTRY ---
+# Every backend is duck-typed like a loaded openai-whisper model:
+#   backend.transcribe(audio, language=..., initial_prompt=..., **options) -> {"text": ...}
+# where 'audio' is a float32 16 kHz NumPy array (or a file path for 'whisper').
+# Select one per deployment with STT_BACKEND in the tutor scripts, or the
+# TUTOR_STT_BACKEND environment variable.
+
+STT_BACKENDS = {}
+
+FASTER_WHISPER_COMPUTE_TYPE = os.environ.get("TUTOR_STT_COMPUTE_TYPE", "int8")
+ONNX_MODEL_DIR = os.environ.get("TUTOR_STT_ONNX_DIR") # Pre-exported model; exported on first load otherwise
+SAMPLE_RATE = 16000
+
+# Whisper takes language names, the other engines take ISO codes
+LANGUAGE_CODES = {
+    "french": "fr", "english": "en", "spanish": "es", "german": "de",
+    "italian": "it", "portuguese": "pt", "dutch": "nl",
+}
+
+
+def register_backend(name):
+    """Class decorator that adds an STT backend to STT_BACKENDS under 'name'."""
+    def decorator(cls):
+        cls.name = name
+        STT_BACKENDS[name] = cls
+        return cls
+    return decorator
+
+
+def language_code(language):
+    """Maps 'French' (Whisper style) to 'fr'; codes pass through unchanged."""
+    if language is None:
+        return None
+    return LANGUAGE_CODES.get(language.lower(), language.lower())
+
+
+def load_backend(name, model_name):
+    """Instantiates and loads the named backend with the given model size."""
+    try:
+        backend_cls = STT_BACKENDS[name]
+    except KeyError:
+        available = ", ".join(sorted(STT_BACKENDS))
+        raise ValueError(f"Unknown STT backend '{name}'. Available: {available}")
+    backend = backend_cls(model_name)
+    logging.info(f"Loaded STT backend {name} ({model_name})")
+    return backend
+
+
+class STTBackend:
+    """Base class: holds the model name and the loaded engine."""
+    name = None
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.model = self.load(model_name)
+
+    def load(self, model_name):
+        raise NotImplementedError
+
+    def transcribe(self, audio, language=None, initial_prompt=None, **options):
+        raise NotImplementedError
+
+
+@register_backend("whisper")
+class WhisperBackend(STTBackend):
+    """The reference openai-whisper engine (PyTorch, fp32 on CPU)."""
+
+    def load(self, model_name):
+        import whisper
+        return whisper.load_model(model_name)
+
+    def transcribe(self, audio, language=None, initial_prompt=None, **options):
+        options.setdefault("fp16", False) # CPU only; avoids the fp16 fallback warning
+        return self.model.transcribe(audio, language=language, initial_prompt=initial_prompt, **options)
+
+
+@register_backend("faster-whisper")
+class FasterWhisperBackend(STTBackend):
+    """CTranslate2 engine via faster-whisper, int8 weights by default."""
+
+    def load(self, model_name):
+        from faster_whisper import WhisperModel
+        return WhisperModel(model_name, device="cpu",
+                            compute_type=FASTER_WHISPER_COMPUTE_TYPE,
+                            cpu_threads=os.cpu_count() or 1)
+
+    def transcribe(self, audio, language=None, initial_prompt=None, **options):
+        options.pop("fp16", None)
+        options.setdefault("beam_size", 5)
+        segments, _ = self.model.transcribe(audio, language=language_code(language),
+                                            initial_prompt=initial_prompt, **options)
+        return {"text": "".join(segment.text for segment in segments)}
+
+
+@register_backend("onnx")
+class OnnxWhisperBackend(STTBackend):
+    """
+    ONNX Runtime engine (the runtime Piper already loads) via optimum.
+    Uses TUTOR_STT_ONNX_DIR if set, otherwise exports openai/whisper-<size> on first load.
+    """
+
+    def load(self, model_name):
+        from optimum.onnxruntime import ORTModelForSpeechSeq2Seq
+        from transformers import WhisperProcessor
+
+        model_id = f"openai/whisper-{model_name}"
+        if ONNX_MODEL_DIR:
+            model = ORTModelForSpeechSeq2Seq.from_pretrained(ONNX_MODEL_DIR)
+        else:
+            model = ORTModelForSpeechSeq2Seq.from_pretrained(model_id, export=True)
+        self.processor = WhisperProcessor.from_pretrained(ONNX_MODEL_DIR or model_id)
+        return model
+
+    def transcribe(self, audio, language=None, initial_prompt=None, **options):
+        if isinstance(audio, str):
+            raise ValueError("The onnx backend needs in-memory audio (IN_MEMORY_AUDIO = True)")
+        features = self.processor(np.asarray(audio, dtype=np.float32),
+                                  sampling_rate=SAMPLE_RATE, return_tensors="pt").input_features
+        generate_kwargs = {"language": language_code(language), "task": "transcribe"}
+        if initial_prompt:
+            generate_kwargs["prompt_ids"] = self.processor.get_prompt_ids(initial_prompt, return_tensors="pt")
+        if "temperature" in options and not isinstance(options["temperature"], (tuple, list)):
+            generate_kwargs["temperature"] = options["temperature"]
+        token_ids = self.model.generate(features, **generate_kwargs)
+        text = self.processor.batch_decode(token_ids, skip_special_tokens=True)[0]
+        # Older transformers versions echo the prompt back in the output
+        if initial_prompt and text.strip().startswith(initial_prompt.strip()):
+            text = text.strip()[len(initial_prompt.strip()):]
+        return {"text": text}
+
+
+# --- LOCAL DAEMON PROTOCOL ---
+# Messages on the Unix socket are: 4-byte big-endian header length, a UTF-8
+# JSON header, then 'payload_bytes' of raw data (float32 16 kHz PCM for requests).
+DAEMON_SOCKET = os.environ.get("TUTOR_STT_SOCKET", "/tmp/language-tutor-stt.sock")
+DAEMON_PING_TIMEOUT = 2.0 # Seconds a live daemon has to answer select_backend()'s ping
+
+
+def _recv_exact(sock, n):
+    chunks = []
+    while n:
+        chunk = sock.recv(min(n, 1 << 20))
+        if not chunk:
+            raise ConnectionError("STT daemon connection closed")
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_message(sock, header, payload=b""):
+    """Sends one framed message (JSON header + raw payload) over 'sock'."""
+    header = dict(header, payload_bytes=len(payload))
+    encoded = json.dumps(header).encode("utf-8")
+    sock.sendall(struct.pack(">I", len(encoded)) + encoded)
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_message(sock):
+    """Receives one framed message and returns (header, payload)."""
+    (length,) = struct.unpack(">I", _recv_exact(sock, 4))
+    header = json.loads(_recv_exact(sock, length).decode("utf-8"))
+    payload = _recv_exact(sock, header.get("payload_bytes", 0)) if header.get("payload_bytes") else b""
+    return header, payload
+
+
+def load_wav_16k(path):
+    """Reads a 16-bit mono 16 kHz WAV (the tutor's TEMP_AUDIO_FILE) into float32."""
+    with wave.open(path, "rb") as wf:
+        if wf.getframerate() != SAMPLE_RATE or wf.getsampwidth() != 2:
+            raise ValueError(f"Expected 16-bit {SAMPLE_RATE} Hz WAV: {path}")
+        frames = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    return frames.reshape(-1, wf.getnchannels()).mean(axis=1).astype(np.float32) / 32768.0
+
+
+def daemon_available(socket_path=DAEMON_SOCKET, timeout=DAEMON_PING_TIMEOUT):
+    """True when a tutor_daemon.py answers a ping on 'socket_path' (a stale socket file doesn't)."""
+    if not os.path.exists(socket_path):
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            send_message(sock, {"op": "ping"})
+            header, _ = recv_message(sock)
+        return bool(header.get("ok"))
+    except (OSError, ValueError) as e:
+        logging.info(f"STT daemon socket {socket_path} not answering: {e}")
+        return False
+
+
+def select_backend(preferred, use_daemon=True):
+    """
+    The backend a tutor should load: the 'remote' client when a tutor_daemon.py
+    is serving on DAEMON_SOCKET (no local model load), else 'preferred'.
+    A socket file left behind by a killed daemon falls back to 'preferred'.
+    """
+    if use_daemon and daemon_available():
+        return "remote"
+    if use_daemon and os.path.exists(DAEMON_SOCKET):
+        print(f"⚠️ STT daemon socket {DAEMON_SOCKET} is stale; loading the '{preferred}' backend locally.")
+    return preferred
+
+
+@register_backend("remote")
+class RemoteBackend(STTBackend):
+    """
+    Thin client for tutor_daemon.py: the model stays resident in the daemon and
+    each transcribe() ships raw PCM over the Unix socket. 'model_name' is ignored.
+    """
+
+    def load(self, model_name):
+        self._lock = threading.Lock()
+        self._sock = None
+        header = self._request({"op": "ping"})
+        logging.info(f"Connected to STT daemon: {header.get('backend')} {header.get('model')}")
+        self.served_model = f"{header.get('backend')} {header.get('model')}"
+        return None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(DAEMON_SOCKET)
+        return sock
+
+    def _request(self, header, payload=b""):
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._sock is None:
+                        self._sock = self._connect()
+                    send_message(self._sock, header, payload)
+                    response, _ = recv_message(self._sock)
+                    break
+                except (ConnectionError, OSError):
+                    # Daemon restarted: reconnect once, then give up
+                    if self._sock is not None:
+                        self._sock.close()
+                    self._sock = None
+                    if attempt == 2:
+                        raise
+        if not response.get("ok"):
+            raise RuntimeError(f"STT daemon error: {response.get('error')}")
+        return response
+
+    def transcribe(self, audio, language=None, initial_prompt=None, **options):
+        if isinstance(audio, str):
+            audio = load_wav_16k(audio)
+        pcm = np.ascontiguousarray(audio, dtype=np.float32).tobytes()
+        response = self._request({"op": "transcribe", "language": language,
+                                  "initial_prompt": initial_prompt, "options": options}, pcm)
+        return {"text": response["text"]}
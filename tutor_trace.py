@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import contextlib
+import collections
+import numpy as np
+
+# --- ROUND TRACING ---
+# Timestamps every stage of a tutor round (selection, tts, playback, the
+# learner's wait before pressing ENTER, capture, wav_save, transcription,
+# comparison, plus the whole round) as spans.
+# Spans are appended to a JSONL file; after each round a Prometheus textfile
+# (for node_exporter's textfile collector) is rewritten with per-stage
+# quantiles, so a fleet of Pis can be scraped. Summaries:
+#
+#   python tutor_trace.py                         # this Pi's trace file
+#   python tutor_trace.py pi-*/spans.jsonl        # several Pis' files together
+
+TRACE_DIR = os.path.expanduser("~/.local/share/language-tutor/trace")
+TRACE_FILE = os.path.join(TRACE_DIR, "spans.jsonl")
+PROM_FILE = os.environ.get("TUTOR_PROM_FILE", os.path.join(TRACE_DIR, "language_tutor.prom"))
+SUMMARY_WINDOW = 1000 # Recent spans per stage kept for the live quantiles
+STAGES = ("selection", "tts", "playback", "prompt_wait", "capture", "wav_save", "transcription", "comparison",
+          "round")
+
+
+def percentile_summary(durations):
+    """count / mean / p50 / p95 (seconds) of a list of durations."""
+    values = np.asarray(durations, dtype=np.float64)
+    return {"count": len(values), "mean": float(values.mean()),
+            "p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95))}
+
+
+class Tracer:
+    """
+    Collects spans for one session. span() times a block, record() adds a
+    duration measured elsewhere (e.g. on the prefetch worker). The round a
+    span belongs to is passed explicitly or taken from the calling thread's
+    bind()/round context. Disabled tracers keep the API but record nothing.
+    """
+    def __init__(self, jsonl_path=TRACE_FILE, prom_path=PROM_FILE, enabled=True):
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self.session = time.strftime("%Y%m%d-%H%M%S")
+        self.host = socket.gethostname()
+        self._recent = collections.defaultdict(lambda: collections.deque(maxlen=SUMMARY_WINDOW))
+        self._totals = collections.defaultdict(lambda: [0, 0.0]) # stage -> [count, sum]
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._file = None
+        if enabled:
+            os.makedirs(os.path.dirname(jsonl_path) or ".", exist_ok=True)
+            self._file = open(jsonl_path, "a", encoding="utf-8")
+
+    @contextlib.contextmanager
+    def round(self, round_no):
+        """Spans opened in this thread inside the block belong to 'round_no'."""
+        previous = getattr(self._local, "round", None)
+        self._local.round = round_no
+        try:
+            yield
+        finally:
+            self._local.round = previous
+
+    def bind(self, round_no, func):
+        """Wraps 'func' so its spans belong to 'round_no' on whichever thread runs it."""
+        def bound(*args, **kwargs):
+            with self.round(round_no):
+                return func(*args, **kwargs)
+        return bound
+
+    @contextlib.contextmanager
+    def span(self, stage, round_no=None, **attrs):
+        """Times the enclosed block as one 'stage' span."""
+        start_wall = time.time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, round_no, start=start_wall, **attrs)
+
+    def record(self, stage, seconds, round_no=None, start=None, **attrs):
+        """Adds a span of 'seconds' for 'stage'."""
+        if not self.enabled:
+            return
+        if round_no is None:
+            round_no = getattr(self._local, "round", None)
+        span = {"session": self.session, "host": self.host, "round": round_no, "stage": stage,
+                "start": start if start is not None else time.time() - seconds, "seconds": seconds}
+        span.update(attrs)
+        line = json.dumps(span, ensure_ascii=False, default=str)
+        with self._lock:
+            self._recent[stage].append(seconds)
+            totals = self._totals[stage]
+            totals[0] += 1
+            totals[1] += seconds
+            self._file.write(line + "\n") # Buffered; flushed in end_round()
+
+    def end_round(self):
+        """Flushes the round's spans and rewrites the Prometheus textfile."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._file.flush()
+            recent = {stage: list(values) for stage, values in self._recent.items()}
+            totals = {stage: tuple(values) for stage, values in self._totals.items()}
+        try:
+            self.write_prometheus(recent, totals)
+        except OSError as e:
+            print(f"⚠️ Could not write {self.prom_path}: {e}")
+
+    def write_prometheus(self, recent, totals):
+        lines = ["# HELP tutor_stage_seconds Duration of each tutor round stage.",
+                 "# TYPE tutor_stage_seconds summary"]
+        for stage in sorted(recent):
+            stats = percentile_summary(recent[stage])
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95")):
+                lines.append(f'tutor_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {stats[key]:.6f}')
+            count, total = totals[stage]
+            lines.append(f'tutor_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'tutor_stage_seconds_count{{stage="{stage}"}} {count}')
+        tmp_path = self.prom_path + ".tmp"
+        os.makedirs(os.path.dirname(self.prom_path) or ".", exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prom_path) # The collector never sees a partial file
+
+    def summary(self):
+        """Per-stage count/mean/p50/p95 of this session's recent spans."""
+        with self._lock:
+            return {stage: percentile_summary(values) for stage, values in self._recent.items() if values}
+
+    def close(self):
+        if self._file is not None:
+            self.end_round()
+            self._file.close()
+            self._file = None
+
+
+def print_stage_summary(summary, title="Stage latency"):
+    """Prints a per-stage p50/p95 table, in round order."""
+    if not summary:
+        print("No spans recorded.")
+        return
+    print(f"\n--- {title} (seconds) ---")
+    print(f"{'stage':<14}{'count':>7}{'mean':>9}{'p50':>9}{'p95':>9}")
+    order = [stage for stage in STAGES if stage in summary] + sorted(set(summary) - set(STAGES))
+    for stage in order:
+        stats = summary[stage]
+        print(f"{stage:<14}{stats['count']:>7}{stats['mean']:>9.3f}{stats['p50']:>9.3f}{stats['p95']:>9.3f}")
+
+
+def summarize_files(paths, host=None):
+    """Per-stage summary over span JSONL files (optionally one host's spans only)."""
+    durations = collections.defaultdict(list)
+    for path in paths:
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    continue
+                if host is None or span.get("host") == host:
+                    durations[span["stage"]].append(span["seconds"])
+    return {stage: percentile_summary(values) for stage, values in durations.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize tutor round spans (p50/p95 per stage)")
+    parser.add_argument("files", nargs="*", default=[TRACE_FILE], help="span JSONL files")
+    parser.add_argument("--host", help="only spans from this host")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    missing = [path for path in args.files if not os.path.exists(path)]
+    if missing:
+        print(f"FATAL: Trace file not found: {', '.join(missing)}")
+        sys.exit(1)
+    summary = summarize_files(args.files, args.host)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_stage_summary(summary)